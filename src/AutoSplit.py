@@ -28,20 +28,28 @@ from AutoSplitImage import COMPARISON_RESIZE, AutoSplitImage, ImageType
 import error_messages
 import settings_file as settings
 from AutoControlledWorker import AutoControlledWorker
+from capture_frame import CaptureFrame
 from capture_windows import capture_region, Rect, set_ui_image
+from frame_change import FrameChangeDetector
+from loaded_route import LoadedRoute
 from gen import about, design, update_checker
 from hotkeys import send_command, after_setting_hotkey, set_split_hotkey, set_reset_hotkey, set_skip_split_hotkey, \
     set_undo_split_hotkey, set_pause_hotkey
-from menu_bar import open_about, VERSION, view_help, check_for_updates, open_update_checker
+from look_ahead import LOOK_AHEAD_FRAME_INTERVAL, LOOK_AHEAD_SPLITS, LookAhead, send_missed_splits
+from menu_bar import open_about, VERSION, view_help, check_for_updates, open_update_checker, \
+    set_comparison_pixel_budget
 from screen_region import select_region, select_window, align_region, validate_before_parsing
 from settings_file import FROZEN
-from split_parser import BELOW_FLAG, DUMMY_FLAG, PAUSE_FLAG, parse_and_validate_images
+from split_image_window import SplitImageWindow
+from split_parser import BELOW_FLAG, DUMMY_FLAG, PAUSE_FLAG, export_route_pack, parse_and_validate_images
 
 CREATE_NEW_ISSUE_MESSAGE = "Please create a New Issue at <a href='https://github.com/Toufool/Auto-Split/issues'>" \
     "github.com/Toufool/Auto-Split/issues</a>, describe what happened, and copy & paste the error message below"
 START_IMAGE_TEXT = "Start Image"
 START_AUTO_SPLITTER_TEXT = "Start Auto Splitter"
 CHECK_FPS_ITERATIONS = 10
+SPLIT_IMAGE_PREFETCH = LOOK_AHEAD_SPLITS + 1
+"""Amount of split images after the current one kept loaded when loading split images lazily"""
 
 # Needed when compiled, along with the custom hook-requests PyInstaller hook
 os.environ["REQUESTS_CA_BUNDLE"] = certifi.where()
@@ -99,6 +107,8 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
     hwnd = 0
     """Window Handle used for Capture Region"""
     selection = Rect()
+    comparison_pixel_budget = 0
+    """Maximum amount of pixels per comparison, 0 to compare at a fixed 320x240"""
     last_saved_settings: list[Union[str, float, int, bool]] = []
     save_settings_file_path = ""
     load_settings_file_path = ""
@@ -106,6 +116,16 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
     split_image_number = 0
     split_images_and_loop_number: list[tuple[AutoSplitImage, int]] = []
     split_groups: list[list[int]] = []
+    split_frame_count = 0
+    """Captures compared with split images since the run started"""
+    look_ahead = LookAhead()
+    """Split images ahead of the current one, to recover from missed splits"""
+    frame_change_detector = FrameChangeDetector(COMPARISON_RESIZE)
+    """Creates the frames to compare, reusing or following the previous frame depending on the options"""
+    loaded_route = LoadedRoute()
+    """Split images kept loaded between runs, only loaded again when their file changes"""
+    split_image_window = SplitImageWindow(SPLIT_IMAGE_PREFETCH)
+    """Split images around the current one, the only ones loaded when loading split images lazily"""
 
     # Last loaded settings and last successful loaded settings file path to None until we try to load them
     last_loaded_settings: list[Union[str, float, int]] = []
@@ -147,6 +167,8 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
         self.action_save_settings.triggered.connect(lambda: settings.save_settings(self))
         self.action_save_settings_as.triggered.connect(lambda: settings.save_settings_as(self))
         self.action_load_settings.triggered.connect(lambda: settings.load_settings(self))
+        self.action_export_route_pack.triggered.connect(self.__export_route_pack)
+        self.action_comparison_resolution.triggered.connect(lambda: set_comparison_pixel_budget(self))
 
         if self.is_auto_controlled:
             self.set_split_hotkey_button.setEnabled(False)
@@ -266,7 +288,7 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
 
             # Set live image in UI
             capture = capture_region(self.hwnd, self.selection, self.force_print_window_checkbox.isChecked())
-            set_ui_image(self.live_image, capture, False)
+            set_ui_image(self.live_image, capture)
 
         except AttributeError:
             pass
@@ -446,7 +468,7 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
             while count < CHECK_FPS_ITERATIONS:
                 capture = self.__get_capture_for_comparison()
                 _ = image.compare_with_capture(self, capture)
-                set_ui_image(self.current_split_image, image.bytes, True)
+                set_ui_image(self.current_split_image, image.bytes, image.mask)
                 count += 1
         self.current_split_image.clear()
 
@@ -547,6 +569,7 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
                 for split_image
                 in self.split_images]
             for item in flattenlist]
+        self.split_image_window.set_images([image for image, _ in self.split_images_and_loop_number])
 
         # Construct groups of splits if needed
         self.split_groups = []
@@ -566,6 +589,9 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
         self.split_image_number = 0
         self.waiting_for_split_delay = False
         self.split_below_threshold = False
+        self.look_ahead.reset()
+        self.split_frame_count = 0
+        self.frame_change_detector.reset()
         split_time = 0
         number_of_split_images = len(self.split_images_and_loop_number)
         dummy_splits_array = [image.check_flag(DUMMY_FLAG) for image in self.split_images]
@@ -592,6 +618,7 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
 
                 # calculate similarity for reset image
                 capture = self.__get_capture_for_comparison()
+                self.split_frame_count += 1
 
                 _ = self.__reset_if_should(capture)
 
@@ -606,6 +633,14 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
                     str(self.similarity)[:4]
                     if self.show_live_similarity_checkbox.isChecked()
                     else " ")
+                # Estimated similarities also show their confidence interval when hovered
+                similarity_bounds = self.split_image.get_similarity_bounds(self, capture) \
+                    if self.show_live_similarity_checkbox.isChecked() \
+                    else None
+                self.live_similarity_label.setToolTip(
+                    f"95% confidence interval: {similarity_bounds[0]:.2f} to {similarity_bounds[1]:.2f}"
+                    if similarity_bounds
+                    else "")
 
                 # if the similarity becomes higher than highest similarity, set it as such.
                 if self.similarity > self.highest_similarity:
@@ -640,6 +675,9 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
                     elif self.split_image.check_flag(BELOW_FLAG) and self.split_below_threshold:
                         self.split_below_threshold = False
                         break
+                    # The current split image doesn't match, check if a split image ahead does
+                    elif not self.split_below_threshold and self.__recover_missed_split(capture):
+                        continue
 
                 # limit the number of time the comparison runs to reduce cpu usage
                 frame_interval: float = 1 / self.fps_limit_spinbox.value()
@@ -741,6 +779,7 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
         self.timer_start_image.stop()
         self.start_auto_splitter_button.setText("Running...")
         self.browse_button.setEnabled(False)
+        self.action_export_route_pack.setEnabled(False)
         self.group_dummy_splits_checkbox.setEnabled(False)
         self.start_image_reload_button.setEnabled(False)
 
@@ -763,9 +802,11 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
         self.current_split_image.setText(" ")
         self.current_split_image_file_label.setText(" ")
         self.live_similarity_label.setText(" ")
+        self.live_similarity_label.setToolTip("")
         self.highest_similarity_label.setText(" ")
         self.current_similarity_threshold_number_label.setText(" ")
         self.browse_button.setEnabled(True)
+        self.action_export_route_pack.setEnabled(True)
         self.group_dummy_splits_checkbox.setEnabled(True)
         self.start_image_reload_button.setEnabled(True)
 
@@ -783,14 +824,25 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
         QApplication.processEvents()
         self.load_start_image(False, False)
 
+    def __export_route_pack(self):
+        if validate_before_parsing(self):
+            export_route_pack(self)
+
     def __get_capture_for_comparison(self):
         """
-        Grab capture region and resize for comparison
+        Grab capture region as a new frame. Resizing and other preprocessing is done lazily by the frame,
+        once for every image compared against it. If the capture didn't change, the previous frame can be reused.
+        The capture is resized to the comparison size of each image, which comes from the pixel budget.
         """
         capture = capture_region(self.hwnd, self.selection, self.force_print_window_checkbox.isChecked())
-        return None if capture is None else cv2.resize(capture, COMPARISON_RESIZE, interpolation=cv2.INTER_NEAREST)
+        if capture is None:
+            return None
+        return self.frame_change_detector.next_frame(
+            capture,
+            self.action_skip_unchanged_frames.isChecked(),
+            self.action_incremental_comparison.isChecked())
 
-    def __reset_if_should(self, capture: Optional[cv2.ndarray]):
+    def __reset_if_should(self, capture: Optional[CaptureFrame]):
         """
         Check if we should reset, resets if it's the case, and returns the result
         """
@@ -806,6 +858,25 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
             self.reset()
         return should_reset
 
+    def __recover_missed_split(self, capture: Optional[CaptureFrame]):
+        """
+        If look ahead is enabled and one of the next few split images clearly matches,
+        send the splits that were missed and move on to that split image. It will then be split normally.
+        Returns whether a missed split was recovered.
+        """
+        if capture is None \
+                or not self.action_look_ahead.isChecked() \
+                or self.split_frame_count % LOOK_AHEAD_FRAME_INTERVAL:
+            return False
+
+        split_image_number = self.look_ahead.find_missed_split(self, capture)
+        if split_image_number is None:
+            return False
+        send_missed_splits(self, split_image_number)
+        self.split_image_number = split_image_number
+        self.__update_split_image()
+        return True
+
     def __update_split_image(self, specific_image: Optional[AutoSplitImage] = None, from_start_image: bool = False):
         # Splitting/skipping when there are no images left or Undoing past the first image
         # Start image is expected to be out of range (index 0 of 0-length array)
@@ -816,8 +887,15 @@ class AutoSplit(QMainWindow, design.Ui_MainWindow):
 
         # Get split image
         self.split_image = specific_image or self.split_images_and_loop_number[0 + self.split_image_number][0]
-        if self.split_image.bytes is not None:
-            set_ui_image(self.current_split_image, self.split_image.bytes, True)
+        if not from_start_image and self.action_lazy_split_image_loading.isChecked():
+            self.split_image_window.move_to(self.split_image_number, self.comparison_method_combobox.currentIndex())
+        self.split_image.load()
+        if self.split_image.bytes is None:
+            # Lazy images are only decoded when they are needed, a corrupted file can't be caught when parsing
+            error_messages.image_type(self.split_image.path)
+            self.reset()
+            return
+        set_ui_image(self.current_split_image, self.split_image.bytes, self.split_image.mask)
 
         self.current_split_image_file_label.setText(self.split_image.filename)
         self.current_similarity_threshold_number_label.setText(f"{self.split_image.get_similarity_threshold(self):.2f}")
@@ -2,21 +2,75 @@ from __future__ import annotations
 
 from enum import Enum
 import os
-from typing import Optional, Union, TYPE_CHECKING
+from threading import Lock
+from typing import Any, Optional, Union, TYPE_CHECKING
 if TYPE_CHECKING:
     from AutoSplit import AutoSplit
 
 import cv2
 import numpy as np
+from PIL import Image
 from win32con import MAXBYTE
-import error_messages
-from compare import check_if_image_has_transparency, compare_histograms, compare_l2_norm, compare_phash
+from capture_frame import CaptureFrame, luma_frame, to_bgr, to_grayscale
+from cascade_compare import CascadeReference, compare_cascade, prepare_cascade
+from compare import COMPARISON_METHODS, check_if_image_has_transparency
+from image_cache import image_cache_file, load_cached_image, save_cached_image
 
 
 # Resize to these width and height so that FPS performance increases
 COMPARISON_RESIZE_WIDTH = 320
 COMPARISON_RESIZE_HEIGHT = 240
 COMPARISON_RESIZE = (COMPARISON_RESIZE_WIDTH, COMPARISON_RESIZE_HEIGHT)
+# Largest pixel budget that can be set for the comparison resolution, a 4K capture region compared at native size
+MAX_COMPARISON_PIXEL_BUDGET = 3840 * 2160
+
+# Extensions of the image formats cv2.imread can decode, other files in the split image folder are ignored
+SUPPORTED_IMREAD_FORMATS = (
+    ".png", ".jpg", ".jpeg", ".jpe", ".jp2", ".bmp", ".dib", ".webp",
+    ".pbm", ".pgm", ".ppm", ".pxm", ".pnm", ".sr", ".ras", ".tiff", ".tif")
+# JPEG images are decoded straight at a reduced size, by skipping high frequencies of the DCT.
+# They can't have transparency, and their pixels are already approximated, so this barely changes comparisons.
+# Other formats would be fully decoded then resized, which is slower than the nearest neighbor resize.
+REDUCED_IMREAD_FORMATS = (".jpg", ".jpeg", ".jpe")
+REDUCED_IMREAD_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def comparison_size_for_budget(region_size: tuple[int, int], pixel_budget: int):
+    """
+    Get the largest comparison width and height that fits in the pixel budget while keeping the aspect ratio
+    of the capture region. Regions that already fit are compared at their native size, never upscaled.
+
+    @param region_size: Width and height of the capture region
+    @param pixel_budget: Maximum amount of pixels per comparison, 0 to use the fixed COMPARISON_RESIZE
+    @return: The width and height to resize images and captures to
+    """
+    width, height = region_size
+    if pixel_budget <= 0 or width <= 0 or height <= 0:
+        return COMPARISON_RESIZE
+    scale = min(1.0, (pixel_budget / (width * height)) ** 0.5)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def imread_flags(path: str, size: tuple[int, int]):
+    """
+    Get the flags to decode the image at the smallest reduced size that still covers the comparison size
+    """
+    if not path.lower().endswith(REDUCED_IMREAD_FORMATS):
+        return cv2.IMREAD_UNCHANGED
+    try:
+        # Only reads the header
+        with Image.open(path) as image:
+            width, height = image.size
+    except OSError:
+        return cv2.IMREAD_UNCHANGED
+    for factor, flag in REDUCED_IMREAD_FLAGS:
+        if width // factor >= size[0] and height // factor >= size[1]:
+            # Unlike IMREAD_UNCHANGED, reduced modes would rotate the image according to its EXIF orientation
+            return flag | cv2.IMREAD_IGNORE_ORIENTATION
+    return cv2.IMREAD_UNCHANGED
 
 
 class ImageType(Enum):
@@ -25,6 +79,32 @@ class ImageType(Enum):
     START = 2
 
 
+class ImageLoadState():
+    """
+    How a split image is loaded, and the reference data prepared from its pixels
+    """
+    cache_file: Optional[str]
+    """Where the loaded image is cached, if caching is enabled"""
+    loaded = False
+    valid: Optional[bool] = None
+    """Whether the image can be loaded, once checked. Kept when unloading, since the file didn't change."""
+    lock: Lock
+    prepared: dict[int, Any]
+    """Reference data of each comparison method, prepared once and reused for every capture"""
+    prepared_cascades: dict[int, CascadeReference]
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self.cache_file = cache_file
+        self.lock = Lock()
+        self.prepared = {}
+        self.prepared_cascades = {}
+
+    def unload(self):
+        self.loaded = False
+        self.prepared = {}
+        self.prepared_cascades = {}
+
+
 class AutoSplitImage():
     path: str
     filename: str
@@ -32,6 +112,12 @@ class AutoSplitImage():
     loops: int
     delay: float
     image_type: ImageType
+    size: tuple[int, int]
+    """Width and height the image and the captures are resized to for comparison"""
+    grayscale: bool
+    """Whether the image is stored and compared in grayscale only"""
+    lazy: bool = False
+    """Whether the image is only loaded when needed, and can be unloaded"""
     bytes: Optional[cv2.ndarray] = None
     mask: Optional[cv2.ndarray] = None
     # This value is internal, check for mask instead
@@ -39,6 +125,8 @@ class AutoSplitImage():
     # These values should be overriden by defaults if null, use getters instead
     __pause_time: Optional[float] = None
     __similarity_threshold: Optional[float] = None
+    __comparison_method: Optional[int] = None
+    __load_state: ImageLoadState
 
     def get_pause_time(self, default: Union[AutoSplit, float]):
         """
@@ -58,7 +146,24 @@ class AutoSplitImage():
             else default.similarity_threshold_spinbox.value()
         return default_value if self.__similarity_threshold is None else self.__similarity_threshold
 
-    def __init__(self, path: str):
+    def get_comparison_method(self, default: Union[AutoSplit, int]):
+        """
+        Get image's comparison method or fallback to the default value from combobox
+        """
+        default_value: int = default \
+            if isinstance(default, int) \
+            else default.comparison_method_combobox.currentIndex()
+        return default_value if self.__comparison_method is None else self.__comparison_method
+
+    def __init__(
+        self,
+        path: str,
+        grayscale: bool = False,
+        size: tuple[int, int] = COMPARISON_RESIZE,
+        use_cache: bool = False,
+        loaded: Optional[tuple[cv2.ndarray, Optional[cv2.ndarray]]] = None,
+        lazy: bool = False
+    ):
         self.path = path
         self.filename = os.path.split(path)[-1].lower()
         self.flags = flags_from_filename(self.filename)
@@ -66,7 +171,21 @@ class AutoSplitImage():
         self.delay = delay_from_filename(self.filename)
         self._pause_time = pause_from_filename(self.filename)
         self.__similarity_threshold = threshold_from_filename(self.filename)
-        self.__read_image_bytes(path)
+        self.__comparison_method = comparison_method_from_filename(self.filename)
+        self.size = comparison_size_from_filename(self.filename) or size
+        self.grayscale = grayscale or self.check_flag(GRAYSCALE_FLAG)
+        self.__load_state = ImageLoadState(image_cache_file(path, self.size, self.grayscale) if use_cache else None)
+        # Images from a route pack are already loaded, with their mask
+        if loaded is not None:
+            self.bytes, self.mask = loaded
+            self._has_transparency = self.mask is not None
+            self.__load_state.loaded = True
+            self.__load_state.valid = True
+        # Lazy images only keep the settings parsed from their filename until they are loaded
+        elif lazy:
+            self.lazy = True
+        else:
+            self.load()
 
         if "start_auto_splitter" in self.filename:
             self.image_type = ImageType.START
@@ -76,13 +195,23 @@ class AutoSplitImage():
             self.image_type = ImageType.SPLIT
 
     def __read_image_bytes(self, path: str):
-        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        cache_file = self.__load_state.cache_file
+        if cache_file is not None:
+            cached = load_cached_image(cache_file)
+            if cached is not None:
+                self.bytes, self.mask = cached
+                self._has_transparency = self.mask is not None
+                return
+
+        image = cv2.imread(path, imread_flags(path, self.size))
+        # Errors are shown by the caller, since images can be loaded outside of the GUI thread
         if image is None:
             self.bytes = None
-            error_messages.image_type(path)
             return
 
-        image = cv2.resize(image, COMPARISON_RESIZE, interpolation=cv2.INTER_NEAREST)
+        image = cv2.resize(image, self.size, interpolation=cv2.INTER_NEAREST)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
         self._has_transparency = check_if_image_has_transparency(image)
         # If image has transparency, create a mask
         if self._has_transparency:
@@ -90,37 +219,174 @@ class AutoSplitImage():
             lower = np.array([0, 0, 0, 1], dtype="uint8")
             upper = np.array([MAXBYTE, MAXBYTE, MAXBYTE, MAXBYTE], dtype="uint8")
             self.mask = cv2.inRange(image, lower, upper)
-        # Add Alpha channel if missing
-        elif image.shape[2] == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
 
-        self.bytes = image
+        # Transparency is only kept as the mask, images are compared as BGR or grayscale
+        self.bytes = to_grayscale(image) if self.grayscale else to_bgr(image)
+        if cache_file is not None:
+            save_cached_image(cache_file, self.bytes, self.mask)
+
+    def load(self):
+        """
+        Load the image if it isn't loaded yet. Safe to call from a background thread.
+        """
+        with self.__load_state.lock:
+            if not self.__load_state.loaded:
+                self.__read_image_bytes(self.path)
+                self.__load_state.loaded = True
+                self.__load_state.valid = self.bytes is not None
+
+    def unload(self):
+        """
+        Free the pixels and the prepared reference data of a lazy image, it is loaded again on next use
+        """
+        if not self.lazy:
+            return
+        with self.__load_state.lock:
+            self.bytes = None
+            self.mask = None
+            self.__load_state.unload()
+
+    def is_valid(self):
+        """
+        Whether the image can be loaded. Until they are loaded, lazy images are only checked
+        for a supported format, by reading the start of the file. The result is kept,
+        since images are only reused while their file isn't modified.
+        """
+        load_state = self.__load_state
+        if load_state.valid is None:
+            load_state.valid = cv2.haveImageReader(self.path)
+        return load_state.valid
 
     def check_flag(self, flag: int):
         return self.flags & flag == flag
 
+    def get_prepared(self, comparison_method: int) -> Optional[Any]:
+        """
+        Get the reference data of the comparison method, preparing it on first use
+
+        @return: The reference data, or None if the image couldn't be loaded
+        """
+        self.load()
+        image, mask = self.bytes, self.mask
+        if image is None:
+            return None
+        prepared = self.__load_state.prepared.get(comparison_method)
+        if prepared is None:
+            prepared = COMPARISON_METHODS[comparison_method].prepare(image, mask)
+            self.__load_state.prepared[comparison_method] = prepared
+        return prepared
+
+    def get_prepared_cascade(self, comparison_method: int) -> Optional[CascadeReference]:
+        """
+        Get the reference data of the comparison method at every cascade level, preparing it on first use
+
+        @return: The reference data of every level, or None if the image couldn't be loaded
+        """
+        self.load()
+        image, mask = self.bytes, self.mask
+        if image is None:
+            return None
+        cascade = self.__load_state.prepared_cascades.get(comparison_method)
+        if cascade is None:
+            cascade = prepare_cascade(COMPARISON_METHODS[comparison_method], image, mask)
+            self.__load_state.prepared_cascades[comparison_method] = cascade
+        return cascade
+
     def compare_with_capture(
         self,
         comparison: Union[AutoSplit, int],
-        capture: Optional[cv2.ndarray]
+        capture: Optional[CaptureFrame]
     ):
         """
-        Compare image with capture using comparison method from combobox
+        Compare image with capture frame using the image's comparison method,
+        or the comparison method from combobox.
+        When coarse to fine comparison or early threshold decisions are enabled,
+        the similarity is only exact near the image's threshold.
+        The similarity is only compared once per frame for the same settings.
         """
-        comparison_method: int = comparison \
-            if isinstance(comparison, int) \
-            else comparison.comparison_method_combobox.currentIndex()
+        comparison_method = self.get_comparison_method(comparison)
 
-        if self.bytes is None or capture is None:
+        self.load()
+        if self.bytes is None or capture is None or not 0 <= comparison_method < len(COMPARISON_METHODS):
             return 0.0
-        if comparison_method == 0:
-            return compare_l2_norm(self.bytes, capture, self.mask)
-        if comparison_method == 1:
-            return compare_histograms(self.bytes, capture, self.mask)
-        if comparison_method == 2:
-            return compare_phash(self.bytes, capture, self.mask)
-        return 0.0
+        if isinstance(comparison, int):
+            return capture.get(self.__compare_frame, comparison_method, False, False, None)
+
+        similarity_args = (
+            comparison_method,
+            comparison.action_coarse_to_fine.isChecked(),
+            comparison.action_early_threshold_decision.isChecked(),
+            self.get_similarity_threshold(comparison))
+        if capture.has(self.__compare_frame, *similarity_args):
+            comparison.frame_change_detector.avoided_comparison_count += 1
+        return capture.get(self.__compare_frame, *similarity_args)
+
+    def __compare_frame(
+        self,
+        capture: CaptureFrame,
+        comparison_method: int,
+        coarse_to_fine: bool,
+        early_threshold_decision: bool,
+        similarity_threshold: Optional[float]
+    ):
+        """
+        Frame stage: the similarity of this image with the capture.
+        Grayscale images are compared with the capture converted once per frame.
+        """
+        if self.grayscale:
+            capture = capture.get(luma_frame, self.size)
+        method = COMPARISON_METHODS[comparison_method]
+        prepared = self.get_prepared(comparison_method)
+        if prepared is None:
+            return 0.0
+        if similarity_threshold is None:
+            return method.compare(prepared, capture)
+
+        compare_with_threshold = method.compare_with_threshold
+        if early_threshold_decision and compare_with_threshold is not None:
+            def compare_full_size(frame: CaptureFrame):
+                return compare_with_threshold(prepared, frame, similarity_threshold)
+        else:
+            def compare_full_size(frame: CaptureFrame):
+                return method.compare(prepared, frame)
+
+        cascade = self.get_prepared_cascade(comparison_method) if coarse_to_fine and method.coarse_to_fine else None
+        if cascade is not None:
+            return compare_cascade(
+                method,
+                cascade,
+                compare_full_size,
+                capture,
+                similarity_threshold)
+        return compare_full_size(capture)
+
+    def get_similarity_bounds(self, comparison: Union[AutoSplit, int], capture: Optional[CaptureFrame]):
+        """
+        Get the confidence interval of the similarity with the capture frame,
+        for comparison methods that only estimate the similarity
+
+        @return: The lower and upper bounds of the similarity, or None if it isn't estimated
+        """
+        comparison_method = self.get_comparison_method(comparison)
+        if capture is None \
+                or not 0 <= comparison_method < len(COMPARISON_METHODS) \
+                or COMPARISON_METHODS[comparison_method].estimate is None:
+            return None
+        return capture.get(self.__estimate_frame, comparison_method)
+
+    def __estimate_frame(self, capture: CaptureFrame, comparison_method: int) -> Optional[tuple[float, float]]:
+        """
+        Frame stage: the confidence interval of the estimated similarity of this image with the capture
+        """
+        if self.grayscale:
+            capture = capture.get(luma_frame, self.size)
+        estimate = COMPARISON_METHODS[comparison_method].estimate
+        prepared = self.get_prepared(comparison_method)
+        if estimate is None or prepared is None:
+            return None
+        similarity_estimate = estimate(prepared, capture)
+        return similarity_estimate.lower_bound, similarity_estimate.upper_bound
 
 
-from split_parser import delay_from_filename, flags_from_filename, loop_from_filename, pause_from_filename, \
-    threshold_from_filename
+from split_parser import GRAYSCALE_FLAG, comparison_method_from_filename, comparison_size_from_filename, \
+    delay_from_filename, flags_from_filename, loop_from_filename, pause_from_filename, threshold_from_filename
@@ -0,0 +1,210 @@
+from __future__ import annotations
+from collections.abc import Callable, Hashable
+from functools import lru_cache
+from itertools import count
+from typing import Any, Optional, TypeVar
+
+import cv2
+import numpy as np
+
+StageResult = TypeVar("StageResult")
+Region = tuple[int, int, int, int]
+"""x, y, width and height of a region of the comparison size"""
+TILE_SIZE = 40
+"""Width and height of the tiles that are compared incrementally"""
+
+
+class CaptureFrame():
+    """
+    A capture and all the intermediate results derived from it for comparison.
+    Each stage (resize, grayscale, histogram, hash...) is computed lazily, at most once per frame
+    for the same arguments, and shared by every image compared against this frame.
+    """
+    __frame_ids = count()
+    frame_id: int
+    capture: cv2.ndarray
+    previous: Optional[CaptureFrame] = None
+    """The previous frame, so that stages can only update what changed since it"""
+    __results: dict[tuple[Callable[..., Any], tuple[Hashable, ...]], Any]
+
+    def __init__(self, capture: cv2.ndarray):
+        self.frame_id = next(self.__frame_ids)
+        self.capture = capture
+        self.__results = {}
+
+    def follow(self, previous: CaptureFrame):
+        """
+        Set the previous frame. Only one frame is kept, so the previous frame forgets its own previous frame.
+        """
+        previous.previous = None
+        self.previous = previous
+
+    def get(self, stage: Callable[..., StageResult], *args: Hashable) -> StageResult:
+        """
+        Get the result of a stage for this frame, computing it on first use
+
+        @param stage: Function taking this frame followed by the arguments
+        @param args: Hashable arguments of the stage
+        """
+        key = (stage, args)
+        if key in self.__results:
+            return self.__results[key]
+        result = stage(self, *args)
+        self.__results[key] = result
+        return result
+
+    def has(self, stage: Callable[..., Any], *args: Hashable):
+        """
+        Whether the result of a stage was already computed for this frame
+        """
+        return (stage, args) in self.__results
+
+
+def image_size(image: cv2.ndarray):
+    """
+    Width and height of an image, in the order expected by cv2.resize
+    """
+    return image.shape[1], image.shape[0]
+
+
+def channel_count(image: cv2.ndarray):
+    return 1 if image.ndim == 2 else image.shape[2]
+
+
+def level_size(size: tuple[int, int], factor: int):
+    """
+    Width and height downscaled by an integer factor
+    """
+    return size[0] // factor, size[1] // factor
+
+
+def to_bgr(image: cv2.ndarray):
+    """
+    Drops the alpha channel, transparency is only ever kept as a separate mask
+    """
+    if image.ndim == 3 and image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+
+def resized(frame: CaptureFrame, size: tuple[int, int]):
+    """
+    The capture resized to the comparison size, as BGR.
+    The alpha channel is dropped after resizing, so only the pixels that are kept get converted.
+    Even when the capture is a multiple of the comparison size, a strided view isn't used instead,
+    because OpenCV copies non-contiguous arrays itself, which is slower than resizing.
+    """
+    capture = frame.capture
+    if image_size(capture) != size:
+        capture = cv2.resize(capture, size, interpolation=cv2.INTER_NEAREST)
+    return to_bgr(capture)
+
+
+def full_region(size: tuple[int, int]) -> Region:
+    return (0, 0, *size)
+
+
+def nearest_indexes(source_length: int, length: int) -> cv2.ndarray:
+    """
+    The source pixels a nearest neighbor resize picks along one axis. The scale is computed the same way as
+    cv2.resize, in floating point and inverted, since an exact integer ratio picks other pixels for many sizes.
+    """
+    scale = 1 / (length / source_length)
+    return np.minimum(np.floor(np.arange(length) * scale).astype(np.intp), source_length - 1)
+
+
+def resized_region(frame: CaptureFrame, size: tuple[int, int], region: Region):
+    """
+    A region of the capture resized to the comparison size, as BGR, without resizing the rest of the capture.
+    Picks the same pixels as a nearest neighbor resize of the whole capture would.
+    """
+    if region == full_region(size):
+        return frame.get(resized, size)
+    x, y, width, height = region
+    if image_size(frame.capture) == size:
+        return to_bgr(frame.capture[y:y + height, x:x + width])
+    map_x, map_y = nearest_region_maps(image_size(frame.capture), size, region)
+    return to_bgr(cv2.remap(frame.capture, map_x, map_y, cv2.INTER_NEAREST))
+
+
+@lru_cache(maxsize=64)
+def nearest_region_maps(capture_size: tuple[int, int], size: tuple[int, int], region: Region):
+    """
+    Maps for cv2.remap that crop a region and pick the pixels a nearest neighbor resize to the comparison size
+    would pick, in a single pass. They only depend on the size of the capture, so they are only rebuilt
+    when the selection changes.
+    """
+    x, y, width, height = region
+    rows = nearest_indexes(capture_size[1], size[1])[y:y + height]
+    cols = nearest_indexes(capture_size[0], size[0])[x:x + width]
+    map_x, map_y = np.meshgrid(cols.astype(np.float32), rows.astype(np.float32))
+    return map_x, map_y
+
+
+@lru_cache(maxsize=16)
+def nearest_resize_maps(capture_size: tuple[int, int], size: tuple[int, int], sampling_size: tuple[int, int]):
+    """
+    Maps for cv2.remap that pick the pixels a nearest neighbor resize to the comparison size,
+    followed by a nearest neighbor resize to the sampling size, would pick
+    """
+    rows = nearest_indexes(capture_size[1], size[1])[nearest_indexes(size[1], sampling_size[1])]
+    cols = nearest_indexes(capture_size[0], size[0])[nearest_indexes(size[0], sampling_size[0])]
+    map_x, map_y = np.meshgrid(cols.astype(np.float32), rows.astype(np.float32))
+    return map_x, map_y
+
+
+def resampled(frame: CaptureFrame, size: tuple[int, int], sampling_size: tuple[int, int]):
+    """
+    The capture resized to the comparison size, then to a smaller sampling size, in a single remap
+    that only reads the sampled pixels. The result is BGR.
+    """
+    map_x, map_y = nearest_resize_maps(image_size(frame.capture), size, sampling_size)
+    return to_bgr(cv2.remap(frame.capture, map_x, map_y, cv2.INTER_NEAREST))
+
+
+def tile_starts(length: int):
+    return np.arange(0, length, TILE_SIZE)
+
+
+def changed_tiles(frame: CaptureFrame, size: tuple[int, int], region: Region) -> Optional[cv2.ndarray]:
+    """
+    Frame stage: which tiles of the resized capture region changed since the previous frame,
+    or None if the previous frame didn't resize that region
+    """
+    previous = frame.previous
+    if previous is None or not previous.has(resized_region, size, region):
+        return None
+    difference = cv2.absdiff(frame.get(resized_region, size, region), previous.get(resized_region, size, region))
+    height, width = difference.shape[:2]
+    difference = difference.reshape(height, -1)
+    channels = difference.shape[1] // width
+    # Sum the differences of each band of rows, then of each tile of the bands
+    band_differences = np.vstack([
+        cv2.reduce(difference[start:start + TILE_SIZE], 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S)
+        for start in tile_starts(height)])
+    return np.add.reduceat(band_differences, tile_starts(width) * channels, axis=1) > 0
+
+
+def to_grayscale(image: cv2.ndarray):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+
+def grayscale(frame: CaptureFrame, size: tuple[int, int]):
+    """
+    The resized capture as grayscale
+    """
+    return to_grayscale(frame.get(resized, size))
+
+
+def luma_frame(frame: CaptureFrame, size: tuple[int, int]):
+    """
+    Frame stage: the resized capture converted to grayscale once, as its own frame so that every method
+    can reuse its usual stages on it. It follows the luma frame of the previous frame, if there was one.
+    """
+    luma = CaptureFrame(frame.get(grayscale, size))
+    previous = frame.previous
+    if previous is not None and previous.has(luma_frame, size):
+        luma.follow(previous.get(luma_frame, size))
+    return luma
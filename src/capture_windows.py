@@ -17,6 +17,8 @@ from packaging import version
 from win32 import win32gui
 from win32typing import PyCBitmap, PyCDC
 
+from capture_frame import to_bgr
+
 # This is an undocumented nFlag value for PrintWindow
 PW_RENDERFULLCONTENT = 0x00000002
 accelerated_windows: dict[int, bool] = {}
@@ -99,18 +101,22 @@ def __get_capture_image(hwnd: int, selection: Rect, print_window: bool = False):
     return image
 
 
-def set_ui_image(qlabel: QLabel, image: Optional[cv2.ndarray], transparency: bool):
+def set_ui_image(qlabel: QLabel, image: Optional[cv2.ndarray], mask: Optional[cv2.ndarray] = None):
+    """
+    @param image: BGR, BGRA or grayscale image, its alpha channel is never displayed
+    @param mask: Transparency of the image, displayed as its alpha channel
+    """
     if image is None:
         qlabel.clear()
     else:
-        if transparency:
-            color_code = cv2.COLOR_BGRA2RGBA
-            image_format = QtGui.QImage.Format.Format_RGBA8888
-        else:
-            color_code = cv2.COLOR_BGRA2BGR
+        if mask is None:
+            capture = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else to_bgr(image)
             image_format = QtGui.QImage.Format.Format_BGR888
+        else:
+            capture = cv2.cvtColor(image, cv2.COLOR_GRAY2RGBA if image.ndim == 2 else cv2.COLOR_BGR2RGBA)
+            capture[..., 3] = mask
+            image_format = QtGui.QImage.Format.Format_RGBA8888
 
-        capture = cv2.cvtColor(image, color_code)
         height, width, channels = capture.shape
         qimage = QtGui.QImage(capture.data, width, height, width * channels, image_format)
         qlabel.setPixmap(QtGui.QPixmap(qimage).scaled(
@@ -0,0 +1,87 @@
+from __future__ import annotations
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import cv2
+import numpy as np
+
+from capture_frame import CaptureFrame, image_size, level_size, resized
+from compare import ComparisonMethod
+
+# Downscale factors of the pyramid levels, coarsest first. With the default 320x240 comparison size,
+# these are 40x30 and 80x60. The full size comparison is always the last level.
+CASCADE_FACTORS = (8, 4)
+# A level's similarity is only trusted if it is further than this from the similarity threshold
+CASCADE_MARGINS = (0.1, 0.05)
+
+
+@dataclass
+class CascadeLevel:
+    factor: int
+    margin: float
+    reference: Any
+    """The reference prepared by the comparison method at this level's size"""
+
+
+@dataclass
+class CascadeReference:
+    size: tuple[int, int]
+    levels: list[CascadeLevel]
+
+
+def cascade_frame(frame: CaptureFrame, size: tuple[int, int], factor: int):
+    """
+    Frame stage: the capture downscaled to a pyramid level, as its own frame so that every method
+    can reuse its usual stages on it. The level is sampled straight from the capture, so the full size
+    resize is only done if the comparison escalates to it.
+    """
+    return CaptureFrame(frame.get(resized, level_size(size, factor)))
+
+
+def prepare_cascade(method: ComparisonMethod, source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    """
+    Prepares the reference of a comparison method at every pyramid level.
+    Levels are sampled with the same nearest neighbor interpolation as the captures,
+    levels that would be empty, or that leave no pixel in the mask, are skipped.
+    """
+    size = image_size(source)
+    levels: list[CascadeLevel] = []
+    for factor, margin in zip(CASCADE_FACTORS, CASCADE_MARGINS):
+        downscaled_size = level_size(size, factor)
+        if not all(downscaled_size):
+            continue
+        level_source = cv2.resize(source, downscaled_size, interpolation=cv2.INTER_NEAREST)
+        level_mask = None
+        if mask is not None:
+            level_mask = cv2.resize(mask, downscaled_size, interpolation=cv2.INTER_NEAREST)
+            if not np.any(level_mask):
+                continue
+        levels.append(CascadeLevel(factor, margin, method.prepare(level_source, level_mask)))
+    return CascadeReference(size, levels)
+
+
+def compare_cascade(
+    method: ComparisonMethod,
+    cascade: CascadeReference,
+    compare_full_size: Callable[[CaptureFrame], float],
+    frame: CaptureFrame,
+    similarity_threshold: float
+):
+    """
+    Compares the capture with the reference from the coarsest to the finest level,
+    stopping as soon as a level's similarity is clearly above or below the threshold.
+
+    @param method: Comparison method the references were prepared with
+    @param cascade: The reference prepared at every pyramid level
+    @param compare_full_size: Compares the frame with the reference prepared at full size
+    @param frame: Capture frame
+    @param similarity_threshold: The threshold the similarity is going to be checked against
+    @return: The similarity of the first conclusive level as a number 0 to 1.
+    Only the full size comparison is exact.
+    """
+    for level in cascade.levels:
+        similarity = method.compare(level.reference, frame.get(cascade_frame, cascade.size, level.factor))
+        if abs(similarity - similarity_threshold) > level.margin:
+            return similarity
+    return compare_full_size(frame)
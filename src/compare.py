@@ -1,15 +1,358 @@
 from __future__ import annotations
-from typing import Optional
-from PIL import Image
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from typing import Any, NamedTuple, Optional
 from win32con import MAXBYTE
 import cv2
-import imagehash  # https://github.com/JohannesBuchner/imagehash/issues/151
 import numpy as np
 
+from capture_frame import TILE_SIZE, CaptureFrame, Region, changed_tiles, channel_count, full_region, grayscale, \
+    image_size, level_size, nearest_indexes, resampled, resized, resized_region, tile_starts, to_bgr, to_grayscale
+
 MAXRANGE = MAXBYTE + 1
 channels = [0, 1, 2]
 histogram_size = [8, 8, 8]
 ranges = [0, MAXRANGE, 0, MAXRANGE, 0, MAXRANGE]
+# Same bins as calcHist with the above histogram_size and ranges, packed in 9 bits per pixel as BBBGGGRRR
+HISTOGRAM_BINS = 8 * 8 * 8
+HISTOGRAM_CHANNEL_SHIFT = 5
+# Above this ratio of changed tiles, the histogram of the capture is recounted entirely instead of incrementally
+INCREMENTAL_HISTOGRAM_MAX_CHANGED_TILES = 0.25
+
+# Number of row bands the L2 Error is summed over when comparing against a threshold
+L2_NORM_BANDS = 8
+
+# Number of pixels compared by the sampled L2 Norm, and the seed used to pick them so that they are stable
+SAMPLED_PIXEL_COUNT = 2048
+SAMPLED_PIXEL_SEED = 0
+# Number of standard errors covered by the confidence bounds of the sampled L2 Norm (95%)
+SAMPLED_CONFIDENCE_Z = 1.96
+
+# Width and height of the grid of block means compared by the thumbnail method
+THUMBNAIL_SIZE = (32, 24)
+# The means of each block are taken over this many by this many pixels of the resized image
+THUMBNAIL_BLOCK_SAMPLES = 4
+THUMBNAIL_SAMPLING_SIZE = (THUMBNAIL_SIZE[0] * THUMBNAIL_BLOCK_SAMPLES, THUMBNAIL_SIZE[1] * THUMBNAIL_BLOCK_SAMPLES)
+
+# SSIM is calculated on grayscale images, with the local statistics of each pixel taken over a box window
+SSIM_WINDOW_SIZE = 7
+SSIM_C1 = (0.01 * MAXBYTE) ** 2
+SSIM_C2 = (0.03 * MAXBYTE) ** 2
+
+# The template search method first searches this many pixels around where the template was last found
+TEMPLATE_SEARCH_MARGIN = 16
+# Below this similarity around its last location, the template is searched in the whole capture
+TEMPLATE_SEARCH_CONFIDENCE = 0.95
+# The whole capture is searched downscaled by this factor, then the best match is refined at full size
+TEMPLATE_SEARCH_COARSE_FACTOR = 4
+# Templates smaller than this once downscaled are searched in the whole capture at full size instead
+TEMPLATE_SEARCH_MIN_COARSE_SIZE = 4
+
+# pHash is calculated from the lowest 8x8 frequencies of the DCT of a 32x32 grayscale image
+PHASH_SIZE = 8
+PHASH_IMAGE_SIZE = PHASH_SIZE * 4
+PHASH_BITS = PHASH_SIZE * PHASH_SIZE
+# Rows of the (unscaled) DCT-II matrix, only keeping the frequencies used by the hash.
+# The scaling is irrelevant since the hash only compares coefficients to their median.
+__phash_frequencies = np.arange(PHASH_SIZE).reshape(-1, 1)
+__phash_samples = np.arange(PHASH_IMAGE_SIZE).reshape(1, -1)
+PHASH_DCT_BASIS = np.cos(np.pi * __phash_frequencies * (2 * __phash_samples + 1) / (2 * PHASH_IMAGE_SIZE)) \
+    .astype(np.float32)
+
+
+class ComparisonMethod(NamedTuple):
+    """
+    A comparison method is split in two steps. `prepare` is ran once per reference image
+    and does all the work that only depends on the reference and its mask.
+    `compare` is ran for every capture frame and receives the prepared reference.
+    """
+    name: str
+    prepare: Callable[[cv2.ndarray, Optional[cv2.ndarray]], Any]
+    compare: Callable[[Any, CaptureFrame], float]
+    coarse_to_fine: bool = False
+    """Whether the similarity on downscaled images is a good estimate of the full size similarity"""
+    compare_with_threshold: Optional[Callable[[Any, CaptureFrame, float], float]] = None
+    """Variant of `compare` that can stop as soon as the side of the threshold is known"""
+    estimate: Optional[Callable[[Any, CaptureFrame], SimilarityEstimate]] = None
+    """Variant of `compare` for methods that estimate the similarity, which also returns its confidence interval"""
+
+
+class ComparisonMask():
+    """
+    A mask and the data derived from it.
+    Masks with the same content are equal, so they can be used to share frame stages between images.
+    """
+    array: cv2.ndarray
+    indexes: cv2.ndarray
+    """Flat indexes of the pixels kept by the mask"""
+    __key: bytes
+
+    def __init__(self, mask: cv2.ndarray):
+        self.array = mask
+        self.indexes = np.flatnonzero(mask)
+        self.__key = blake2b(mask.tobytes()).digest()
+
+    @property
+    def key(self):
+        """
+        Digest of the content of the mask
+        """
+        return self.__key
+
+    def __hash__(self):
+        return hash(self.__key)
+
+    def __eq__(self, other: object):
+        return isinstance(other, ComparisonMask) and self.__key == other.key
+
+
+def comparison_mask(mask: Optional[cv2.ndarray]):
+    return None if mask is None else ComparisonMask(mask)
+
+
+def crop_to_mask(source: cv2.ndarray, mask: Optional[cv2.ndarray]):
+    """
+    Crops the source and its mask to the bounding box of the mask,
+    since the pixels outside of it are never compared.
+
+    @return: The cropped source and mask, and the region of the comparison size they were cropped to
+    """
+    region = full_region(image_size(source))
+    if mask is not None:
+        x, y, width, height = cv2.boundingRect(mask)
+        if width and height:
+            region = (x, y, width, height)
+            source = source[y:y + height, x:x + width]
+            mask = mask[y:y + height, x:x + width]
+    return source, mask, region
+
+
+@dataclass
+class HistogramsReference:
+    histogram: cv2.ndarray
+    size: tuple[int, int]
+    region: Region
+    mask: Optional[ComparisonMask]
+
+
+@dataclass
+class LTwoNormReference:
+    source: cv2.ndarray
+    mask: Optional[cv2.ndarray]
+    size: tuple[int, int]
+    region: Region
+    """The source and mask are cropped to this region"""
+    max_error: float
+    bands: list[tuple[slice, float]]
+    """Rows of each band, with the worst squared error possible in all the bands after it"""
+
+
+@dataclass
+class SampledLTwoNormReference:
+    pixels: cv2.ndarray
+    """The sampled pixels of the reference, one per row"""
+    rows: cv2.ndarray
+    cols: cv2.ndarray
+    size: tuple[int, int]
+    population: int
+    """Number of pixels the samples were picked from"""
+    max_pixel_error: float
+    """Max squared error of a single pixel, normalized like the L2 Norm"""
+    capture_indexes: dict[tuple[int, int], tuple[cv2.ndarray, cv2.ndarray]] = field(default_factory=dict)
+    """Positions of the samples in captures of each size"""
+
+
+class SimilarityEstimate(NamedTuple):
+    similarity: float
+    lower_bound: float
+    upper_bound: float
+
+
+@dataclass
+class TemplateReference:
+    source: cv2.ndarray
+    mask: Optional[cv2.ndarray]
+    max_error: float
+
+
+@dataclass
+class TemplateSearchReference:
+    template: cv2.ndarray
+    """The source cropped to its mask"""
+    mask: Optional[cv2.ndarray]
+    coarse_template: Optional[cv2.ndarray]
+    """The template downscaled for the whole capture search, if it isn't too small"""
+    coarse_mask: Optional[cv2.ndarray]
+    size: tuple[int, int]
+    max_error: float
+    location: tuple[int, int]
+    """Top left corner of where the template was last found, starting at its position in the source"""
+
+
+@dataclass
+class ThumbnailReference:
+    thumbnail: cv2.ndarray
+    """Mean color of each block, only counting the pixels kept by the mask, and scaled by the block's weight"""
+    weights: cv2.ndarray
+    """Square root of the ratio of each block kept by the mask, so that squared errors are weighted by that ratio"""
+    size: tuple[int, int]
+    mask: Optional[ComparisonMask]
+    """The mask, sampled at THUMBNAIL_SAMPLING_SIZE"""
+    max_error: float
+
+
+@dataclass
+class SSIMReference:
+    """
+    The grayscale source and the terms of the SSIM formula that only depend on it
+    """
+    source: cv2.ndarray
+    doubled_means: cv2.ndarray
+    mean_terms: cv2.ndarray
+    """Squared local means of the source, plus C1"""
+    variance_terms: cv2.ndarray
+    """Local variances of the source, plus C2"""
+    size: tuple[int, int]
+    region: Region
+    mask: Optional[cv2.ndarray]
+
+
+@dataclass
+class PHashReference:
+    hash: np.uint64
+    size: tuple[int, int]
+    mask: Optional[ComparisonMask]
+
+
+def quantize_histogram_bins(image: cv2.ndarray):
+    """
+    Packs the 3 colour channels of every pixel into its 9 bits histogram bin index.
+
+    @param image: BGR or grayscale image, grayscale pixels are counted as gray colours
+    @return: An array of bin indexes with the same width and height as the image
+    """
+    # Padding each pixel to 4 bytes lets it be read as a single little-endian integer,
+    # so all its channels are quantized at once. This is faster than quantizing the channels one by one.
+    pixels = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA if image.ndim == 2 else cv2.COLOR_BGR2BGRA) \
+        .view(np.uint32)[..., 0]
+    return (((pixels >> HISTOGRAM_CHANNEL_SHIFT) & 0o7) << 6) \
+        | (((pixels >> (8 + HISTOGRAM_CHANNEL_SHIFT)) & 0o7) << 3) \
+        | ((pixels >> (16 + HISTOGRAM_CHANNEL_SHIFT)) & 0o7)
+
+
+def normalized_histogram(bins: cv2.ndarray, mask: Optional[ComparisonMask]):
+    """
+    Counts the quantized pixels kept by the mask and normalizes the histogram like cv2.normalize
+    """
+    values = bins.ravel() if mask is None else bins.ravel()[mask.indexes]
+    return normalize_histogram_counts(np.bincount(values, minlength=HISTOGRAM_BINS))
+
+
+def normalize_histogram_counts(counts: cv2.ndarray):
+    histogram = counts.astype(np.float32)
+    cv2.normalize(histogram, histogram)
+    return histogram
+
+
+def tile_histogram_counts(bins: cv2.ndarray, mask: Optional[ComparisonMask]):
+    """
+    Counts the quantized pixels kept by the mask separately for each tile
+
+    @return: The counts of each tile, with the tiles on the first two axes
+    """
+    height, width = bins.shape
+    tile_rows, tile_cols = len(tile_starts(height)), len(tile_starts(width))
+    tile_indexes = np.add.outer(np.arange(height) // TILE_SIZE * tile_cols, np.arange(width) // TILE_SIZE)
+    values = tile_indexes.ravel() * HISTOGRAM_BINS + bins.ravel()
+    if mask is not None:
+        values = values[mask.indexes]
+    return np.bincount(values, minlength=tile_rows * tile_cols * HISTOGRAM_BINS) \
+        .reshape(tile_rows, tile_cols, HISTOGRAM_BINS)
+
+
+def update_tile_histogram_counts(
+    capture: cv2.ndarray,
+    mask: Optional[ComparisonMask],
+    tiles: cv2.ndarray,
+    tile_counts: cv2.ndarray,
+    counts: cv2.ndarray
+):
+    """
+    Counts the changed tiles of the capture again, updating the counts of each tile and their total in place
+    """
+    for tile_row, tile_col in zip(*np.nonzero(tiles)):
+        rows = slice(tile_row * TILE_SIZE, (tile_row + 1) * TILE_SIZE)
+        cols = slice(tile_col * TILE_SIZE, (tile_col + 1) * TILE_SIZE)
+        bins = quantize_histogram_bins(capture[rows, cols])
+        values = bins.ravel() if mask is None else bins[mask.array[rows, cols] > 0]
+        tile_count = np.bincount(values, minlength=HISTOGRAM_BINS)
+        counts += tile_count - tile_counts[tile_row, tile_col]
+        tile_counts[tile_row, tile_col] = tile_count
+
+
+def histogram_bins(frame: CaptureFrame, size: tuple[int, int], region: Region):
+    """
+    Frame stage: the resized capture region quantized once, for all masks
+    """
+    return quantize_histogram_bins(frame.get(resized_region, size, region))
+
+
+def capture_histogram(
+    frame: CaptureFrame,
+    size: tuple[int, int],
+    region: Region,
+    mask: Optional[ComparisonMask]
+):
+    """
+    Frame stage: the normalized histogram of the capture region, counted once per distinct mask
+    """
+    if frame.previous is not None:
+        _, counts = frame.get(capture_histogram_counts, size, region, mask)
+        return normalize_histogram_counts(counts)
+    return normalized_histogram(frame.get(histogram_bins, size, region), mask)
+
+
+def capture_histogram_counts(
+    frame: CaptureFrame,
+    size: tuple[int, int],
+    region: Region,
+    mask: Optional[ComparisonMask]
+):
+    """
+    Frame stage: the histogram counts of each tile of the capture region, and their total.
+    Only the tiles that changed since the previous frame are counted again.
+    """
+    tiles = frame.get(changed_tiles, size, region)
+    previous = frame.previous
+    if tiles is None \
+            or previous is None \
+            or not previous.has(capture_histogram_counts, size, region, mask) \
+            or np.count_nonzero(tiles) > tiles.size * INCREMENTAL_HISTOGRAM_MAX_CHANGED_TILES:
+        tile_counts = tile_histogram_counts(frame.get(histogram_bins, size, region), mask)
+        return tile_counts, tile_counts.sum(axis=(0, 1))
+
+    previous_tile_counts, previous_counts = previous.get(capture_histogram_counts, size, region, mask)
+    tile_counts = previous_tile_counts.copy()
+    counts = previous_counts.copy()
+    update_tile_histogram_counts(frame.get(resized_region, size, region), mask, tiles, tile_counts, counts)
+    return tile_counts, counts
+
+
+def prepare_histograms(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    size = image_size(source)
+    source, mask, region = crop_to_mask(source, mask)
+    histogram_mask = comparison_mask(mask)
+    return HistogramsReference(
+        normalized_histogram(quantize_histogram_bins(source), histogram_mask),
+        size,
+        region,
+        histogram_mask)
+
+
+def compare_prepared_histograms(reference: HistogramsReference, frame: CaptureFrame):
+    capture_hist = frame.get(capture_histogram, reference.size, reference.region, reference.mask)
+    return 1 - cv2.compareHist(reference.histogram, capture_hist, cv2.HISTCMP_BHATTACHARYYA)
 
 
 def compare_histograms(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
@@ -23,13 +366,73 @@ def compare_histograms(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional
     @return: The similarity between the histograms as a number 0 to 1.
     """
 
-    source_hist = cv2.calcHist([source], channels, mask, histogram_size, ranges)
-    capture_hist = cv2.calcHist([capture], channels, mask, histogram_size, ranges)
+    return compare_prepared_histograms(prepare_histograms(source, mask), CaptureFrame(capture))
+
+
+def prepare_l2_norm(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    # The L2 Error is summed across all pixels, so this normalizes
+    channels_per_pixel = channel_count(source)
+    max_error = (source.size ** 0.5) * MAXBYTE \
+        if mask is None \
+        else (channels_per_pixel * np.count_nonzero(mask) * MAXBYTE * MAXBYTE) ** 0.5
+
+    size = image_size(source)
+    source, mask, region = crop_to_mask(source, mask)
+    height, width = source.shape[:2]
+    band_edges = np.linspace(0, height, min(L2_NORM_BANDS, height) + 1, dtype=int)
+    band_rows = [slice(start, end) for start, end in zip(band_edges[:-1], band_edges[1:])]
+    band_pixels = [
+        (end - start) * width if mask is None else np.count_nonzero(mask[start:end])
+        for start, end in zip(band_edges[:-1], band_edges[1:])]
+    worst_band_errors = np.array(band_pixels, dtype=np.float64) * channels_per_pixel * MAXBYTE * MAXBYTE
+    remaining_worst_errors = worst_band_errors[::-1].cumsum()[::-1] - worst_band_errors
+    return LTwoNormReference(
+        source,
+        mask,
+        size,
+        region,
+        max_error,
+        list(zip(band_rows, remaining_worst_errors.tolist())))
+
 
-    cv2.normalize(source_hist, source_hist)
-    cv2.normalize(capture_hist, capture_hist)
+def compare_prepared_l2_norm(reference: LTwoNormReference, frame: CaptureFrame):
+    if not reference.max_error:
+        return 0.0
+
+    capture = frame.get(resized_region, reference.size, reference.region)
+    # https://github.com/microsoft/pylance-release/issues/2089
+    error = cv2.norm(reference.source, capture, cv2.NORM_L2, reference.mask)  # type: ignore
+    return 1 - (error / reference.max_error)
 
-    return 1 - cv2.compareHist(source_hist, capture_hist, cv2.HISTCMP_BHATTACHARYYA)
+
+def compare_prepared_l2_norm_with_threshold(
+    reference: LTwoNormReference,
+    frame: CaptureFrame,
+    similarity_threshold: float
+):
+    """
+    Sums the L2 Error band by band, and stops as soon as the error is too high to reach the threshold,
+    or too low to go under it even if every remaining pixel was as different as possible.
+
+    @return: The similarity as a number 0 to 1. It is only exact if every band was compared,
+    otherwise it is a bound that is on the same side of the threshold as the exact similarity.
+    """
+    if not reference.max_error:
+        return 0.0
+
+    capture = frame.get(resized_region, reference.size, reference.region)
+    max_squared_error = ((1 - similarity_threshold) * reference.max_error) ** 2
+    squared_error = 0.0
+    for rows, remaining_worst_error in reference.bands:
+        mask = None if reference.mask is None else reference.mask[rows]
+        # https://github.com/microsoft/pylance-release/issues/2089
+        squared_error += cv2.norm(reference.source[rows], capture[rows], cv2.NORM_L2SQR, mask)  # type: ignore
+        if squared_error > max_squared_error:
+            break
+        if squared_error + remaining_worst_error <= max_squared_error:
+            squared_error += remaining_worst_error
+            break
+    return 1 - (squared_error ** 0.5 / reference.max_error)
 
 
 def compare_l2_norm(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
@@ -41,17 +444,96 @@ def compare_l2_norm(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[cv
     @return: The similarity between the images as a number 0 to 1.
     """
 
-    # https://github.com/microsoft/pylance-release/issues/2089
-    error = cv2.norm(source, capture, cv2.NORM_L2, mask)  # type: ignore
+    return compare_prepared_l2_norm(prepare_l2_norm(source, mask), CaptureFrame(capture))
 
-    # The L2 Error is summed across all pixels, so this normalizes
-    max_error = (source.size ** 0.5) * MAXBYTE \
+
+def prepare_sampled_l2_norm(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    height, width = source.shape[:2]
+    candidates = np.arange(height * width) if mask is None else np.flatnonzero(mask)
+    if len(candidates) > SAMPLED_PIXEL_COUNT:
+        # Stratified sampling: one random pixel in each equal slice of the candidates,
+        # so that the samples are spread across the whole image
+        strata = np.linspace(0, len(candidates), SAMPLED_PIXEL_COUNT + 1, dtype=int)
+        offsets = np.random.default_rng(SAMPLED_PIXEL_SEED).integers(0, strata[1:] - strata[:-1])
+        candidates = candidates[strata[:-1] + offsets]
+    rows, cols = np.divmod(candidates, width)
+
+    max_error: float = prepare_l2_norm(source, mask).max_error
+    population = height * width if mask is None else int(np.count_nonzero(mask))
+    return SampledLTwoNormReference(
+        source[rows, cols].reshape(len(rows), -1).astype(np.float64),
+        rows,
+        cols,
+        (width, height),
+        population,
+        float(max_error * max_error / population) if population else 0.0)
+
+
+def sampled_pixel_errors(reference: SampledLTwoNormReference, capture: cv2.ndarray):
+    """
+    Squared error of each sampled pixel, read straight from the capture at the positions
+    a nearest neighbor resize to the reference size would have picked
+    """
+    capture_size = image_size(capture)
+    indexes = reference.capture_indexes.get(capture_size)
+    if indexes is None:
+        rows = nearest_indexes(capture_size[1], reference.size[1])[reference.rows]
+        cols = nearest_indexes(capture_size[0], reference.size[0])[reference.cols]
+        indexes = (rows, cols, rows * capture_size[0] + cols)
+        reference.capture_indexes[capture_size] = indexes
+    rows, cols, flat_indexes = indexes
+    # Gathering from the flattened capture is a lot faster, but needs the capture to be contiguous
+    pixels = np.take(capture.reshape(-1, channel_count(capture)), flat_indexes, axis=0) \
+        if capture.flags.c_contiguous \
+        else capture[rows, cols].reshape(len(rows), -1)
+    # The alpha channel of the capture is skipped, the reference is BGR or grayscale
+    differences = pixels[:, :reference.pixels.shape[1]] - reference.pixels
+    return np.square(differences) @ np.ones(differences.shape[1])
+
+
+def estimate_sampled_l2_norm(reference: SampledLTwoNormReference, frame: CaptureFrame):
+    """
+    Estimates the L2 Norm similarity from the sampled pixels only
+
+    @return: The estimated similarity, and the bounds of its confidence interval, as numbers 0 to 1.
+    """
+    if not reference.max_pixel_error:
+        return SimilarityEstimate(0.0, 0.0, 0.0)
+
+    errors = sampled_pixel_errors(reference, frame.capture)
+    sample_count = len(errors)
+    mean_error = float(errors.sum()) / sample_count
+    variance = max(float(errors @ errors) / sample_count - mean_error * mean_error, 0.0)
+    # Standard error of the mean, with the finite population correction since pixels aren't picked twice
+    finite_population = 1 - sample_count / reference.population
+    standard_error = (variance * finite_population / sample_count) ** 0.5
+
+    def similarity(error: float):
+        return 1 - (max(error, 0.0) / reference.max_pixel_error) ** 0.5
+
+    return SimilarityEstimate(
+        similarity(mean_error),
+        similarity(mean_error + SAMPLED_CONFIDENCE_Z * standard_error),
+        similarity(mean_error - SAMPLED_CONFIDENCE_Z * standard_error))
+
+
+def compare_prepared_sampled_l2_norm(reference: SampledLTwoNormReference, frame: CaptureFrame):
+    return estimate_sampled_l2_norm(reference, frame).similarity
+
+
+def prepare_template(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    # matchTemplate returns the sum of square differences, this is the max
+    # that the value can be. Used for normalizing from 0 to 1.
+    max_error = source.size * MAXBYTE * MAXBYTE \
         if mask is None \
-        else (3 * np.count_nonzero(mask) * MAXBYTE * MAXBYTE) ** 0.5
+        else channel_count(source) * np.count_nonzero(mask) * MAXBYTE * MAXBYTE
+    return TemplateReference(source, mask, max_error)
 
-    if not max_error:
-        return 0.0
-    return 1 - (error / max_error)
+
+def compare_prepared_template(reference: TemplateReference, frame: CaptureFrame):
+    result = cv2.matchTemplate(to_bgr(frame.capture), reference.source, cv2.TM_SQDIFF, mask=reference.mask)
+    min_val, *_ = cv2.minMaxLoc(result)
+    return 1 - (min_val / reference.max_error)
 
 
 def compare_template(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
@@ -66,16 +548,265 @@ def compare_template(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[c
     represented as a number from 0 to 1.
     """
 
-    result = cv2.matchTemplate(capture, source, cv2.TM_SQDIFF, mask=mask)
-    min_val, *_ = cv2.minMaxLoc(result)
+    return compare_prepared_template(prepare_template(source, mask), CaptureFrame(capture))
 
-    # matchTemplate returns the sum of square differences, this is the max
-    # that the value can be. Used for normalizing from 0 to 1.
-    max_error = source.size * MAXBYTE * MAXBYTE \
+
+def search_window(location: tuple[int, int], template_size: tuple[int, int], size: tuple[int, int], margin: int):
+    """
+    The region around a template location, extended by the margin and clipped to the comparison size
+    """
+    x, y = location
+    left, top = max(0, x - margin), max(0, y - margin)
+    right = min(size[0], x + template_size[0] + margin)
+    bottom = min(size[1], y + template_size[1] + margin)
+    return left, top, right - left, bottom - top
+
+
+def match_template(image: cv2.ndarray, template: cv2.ndarray, mask: Optional[cv2.ndarray]):
+    """
+    @return: The smallest sum of square differences of the template over the image, and where it is
+    """
+    result = cv2.matchTemplate(image, template, cv2.TM_SQDIFF, mask=mask)
+    min_val, _, min_loc, _ = cv2.minMaxLoc(result)
+    return min_val, min_loc
+
+
+def area_downscaled(frame: CaptureFrame, size: tuple[int, int], factor: int):
+    """
+    Frame stage: the resized capture downscaled further by averaging blocks of pixels
+    """
+    return cv2.resize(frame.get(resized, size), level_size(size, factor), interpolation=cv2.INTER_AREA)
+
+
+def search_template_window(
+    reference: TemplateSearchReference,
+    frame: CaptureFrame,
+    location: tuple[int, int],
+    margin: int
+):
+    """
+    Searches the template in a window of the resized capture around a location
+
+    @return: The best similarity in the window, and the top left corner of where it was found
+    """
+    window = search_window(location, image_size(reference.template), reference.size, margin)
+    error, (x, y) = match_template(
+        frame.get(resized_region, reference.size, window),
+        reference.template,
+        reference.mask)
+    return 1 - (error / reference.max_error), (window[0] + x, window[1] + y)
+
+
+def prepare_template_search(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    size = image_size(source)
+    template, mask, region = crop_to_mask(source, mask)
+    # Rectangular masks keep the whole template, and matching without a mask is a lot faster
+    if mask is not None and cv2.countNonZero(mask) == mask.size:
+        mask = None
+    # Same normalization as the template matching
+    max_error = template.size * MAXBYTE * MAXBYTE \
+        if mask is None \
+        else channel_count(template) * np.count_nonzero(mask) * MAXBYTE * MAXBYTE
+
+    coarse_template = coarse_mask = None
+    coarse_size = level_size(image_size(template), TEMPLATE_SEARCH_COARSE_FACTOR)
+    if min(coarse_size) >= TEMPLATE_SEARCH_MIN_COARSE_SIZE:
+        # Area averages barely depend on how the template is aligned with the downscaled pixels
+        coarse_template = cv2.resize(template, coarse_size, interpolation=cv2.INTER_AREA)
+        if mask is not None:
+            coarse_mask = cv2.resize(mask, coarse_size, interpolation=cv2.INTER_NEAREST)
+    return TemplateSearchReference(template, mask, coarse_template, coarse_mask, size, max_error, region[:2])
+
+
+def compare_prepared_template_search(reference: TemplateSearchReference, frame: CaptureFrame):
+    """
+    Searches the template around where it was last found first. Only if it isn't found there with confidence,
+    the whole capture is searched downscaled, and the best coarse match is refined at full size.
+    The template's location is remembered for the next frame.
+    """
+    if not reference.max_error:
+        return 0.0
+
+    similarity, location = search_template_window(reference, frame, reference.location, TEMPLATE_SEARCH_MARGIN)
+    if similarity < TEMPLATE_SEARCH_CONFIDENCE:
+        if reference.coarse_template is None:
+            # The template is too small to be downscaled, so the whole capture is searched at full size
+            candidate = search_template_window(reference, frame, (0, 0), max(reference.size))
+        else:
+            coarse_capture = frame.get(area_downscaled, reference.size, TEMPLATE_SEARCH_COARSE_FACTOR)
+            _, (x, y) = match_template(coarse_capture, reference.coarse_template, reference.coarse_mask)
+            candidate = search_template_window(
+                reference,
+                frame,
+                (x * TEMPLATE_SEARCH_COARSE_FACTOR, y * TEMPLATE_SEARCH_COARSE_FACTOR),
+                TEMPLATE_SEARCH_COARSE_FACTOR)
+        if candidate[0] > similarity:
+            similarity, location = candidate
+
+    reference.location = location
+    return similarity
+
+
+def block_means(image: cv2.ndarray, mask: Optional[ComparisonMask]):
+    """
+    Shrinks the colors of the sampled image to a grid of block means with a single area resize.
+    Masked out pixels are excluded from the means by resizing the masked image and the mask,
+    and dividing one by the other.
+
+    @param image: Image sampled at THUMBNAIL_SAMPLING_SIZE
+    @param mask: Mask sampled at THUMBNAIL_SAMPLING_SIZE
+    @return: The mean color of each block, and the ratio of each block kept by the mask
+    """
+    if mask is None:
+        means = cv2.resize(image.astype(np.float32), THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        return means, np.ones(THUMBNAIL_SIZE[::-1], dtype=np.float32)
+
+    masked_sums = cv2.resize(
+        cv2.bitwise_and(image, image, mask=mask.array).astype(np.float32),
+        THUMBNAIL_SIZE,
+        interpolation=cv2.INTER_AREA)
+    weights = cv2.resize(mask.array.astype(np.float32) / MAXBYTE, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    block_weights = weights if masked_sums.ndim == 2 else weights[..., np.newaxis]
+    means = np.divide(masked_sums, block_weights, out=np.zeros_like(masked_sums), where=block_weights > 0)
+    return means, weights
+
+
+def capture_thumbnail(frame: CaptureFrame, size: tuple[int, int], mask: Optional[ComparisonMask]):
+    """
+    Frame stage: the block means of the resized capture, computed once per distinct mask
+    """
+    thumbnail, _ = block_means(frame.get(resampled, size, THUMBNAIL_SAMPLING_SIZE), mask)
+    return thumbnail
+
+
+def prepare_thumbnail(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    thumbnail_mask = None \
         if mask is None \
-        else np.count_nonzero(mask)
+        else ComparisonMask(cv2.resize(mask, THUMBNAIL_SAMPLING_SIZE, interpolation=cv2.INTER_NEAREST))
+    thumbnail, weights = block_means(
+        cv2.resize(source, THUMBNAIL_SAMPLING_SIZE, interpolation=cv2.INTER_NEAREST),
+        thumbnail_mask)
+    # Same normalization as the L2 Norm, on the channels of every weighted block
+    max_error = (channel_count(source) * float(weights.sum()) * MAXBYTE * MAXBYTE) ** 0.5
+    weight_scales = np.sqrt(weights)
+    if thumbnail.ndim == 3:
+        weight_scales = weight_scales[..., np.newaxis]
+    return ThumbnailReference(
+        thumbnail * weight_scales,
+        weight_scales,
+        image_size(source),
+        thumbnail_mask,
+        max_error)
+
+
+def compare_prepared_thumbnail(reference: ThumbnailReference, frame: CaptureFrame):
+    if not reference.max_error:
+        return 0.0
+
+    capture_thumbnail_weighted = frame.get(capture_thumbnail, reference.size, reference.mask) * reference.weights
+    error = cv2.norm(capture_thumbnail_weighted, reference.thumbnail, cv2.NORM_L2)
+    return 1 - (error / reference.max_error)
+
+
+def local_means(image: cv2.ndarray):
+    return cv2.boxFilter(
+        image,
+        cv2.CV_32F,
+        (SSIM_WINDOW_SIZE, SSIM_WINDOW_SIZE),
+        borderType=cv2.BORDER_REFLECT)
+
+
+def local_statistics(image: cv2.ndarray):
+    """
+    @return: The grayscale image as floats, and the local means, squared means and variances of its pixels
+    """
+    gray = to_grayscale(image)
+    means = local_means(gray)
+    squared_means = means * means
+    # Filtering the 8 bits image directly is faster than squaring and filtering floats
+    variances = cv2.sqrBoxFilter(
+        gray,
+        cv2.CV_32F,
+        (SSIM_WINDOW_SIZE, SSIM_WINDOW_SIZE),
+        borderType=cv2.BORDER_REFLECT) - squared_means
+    return gray.astype(np.float32), means, squared_means, variances
+
+
+def capture_local_statistics(frame: CaptureFrame, size: tuple[int, int], region: Region):
+    """
+    Frame stage: the local statistics of the resized capture region, shared by every reference in that region
+    """
+    return local_statistics(frame.get(resized_region, size, region))
+
+
+def prepare_ssim(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    size = image_size(source)
+    source, mask, region = crop_to_mask(source, mask)
+    pixels, means, squared_means, variances = local_statistics(source)
+    return SSIMReference(pixels, 2 * means, squared_means + SSIM_C1, variances + SSIM_C2, size, region, mask)
+
+
+def compare_prepared_ssim(reference: SSIMReference, frame: CaptureFrame):
+    capture, means, squared_means, variances = frame.get(
+        capture_local_statistics,
+        reference.size,
+        reference.region)
+    # Only the covariance depends on both images, the rest of the reference's terms are precomputed.
+    # Operations are done in place, since allocating the intermediate images costs as much as computing them.
+    mean_products = cv2.multiply(reference.doubled_means, means)
+    doubled_covariances_term = local_means(cv2.multiply(capture, reference.source))
+    doubled_covariances_term *= 2
+    doubled_covariances_term -= mean_products
+    doubled_covariances_term += SSIM_C2
+    mean_products += SSIM_C1
+    ssim_map = cv2.multiply(mean_products, doubled_covariances_term)
+    ssim_map /= cv2.multiply(
+        cv2.add(reference.mean_terms, squared_means),
+        cv2.add(reference.variance_terms, variances))
+    ssim: float = cv2.mean(ssim_map, reference.mask)[0]
+    # SSIM goes down to -1 for inverted images, which aren't any more similar than unrelated images
+    return max(ssim, 0.0)
+
+
+def phash(image: cv2.ndarray, mask: Optional[ComparisonMask]):
+    """
+    Calculates the pHash of an image as a 64 bits unsigned integer, without any round-trip through PIL.
+    Masked out pixels are set to black before hashing.
+    """
+    image = to_grayscale(image)
+    if mask is not None:
+        image = cv2.bitwise_and(image, image, mask=mask.array)
+
+    pixels = cv2.resize(image, (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), interpolation=cv2.INTER_AREA) \
+        .astype(np.float32)
+    low_frequencies = PHASH_DCT_BASIS @ pixels @ PHASH_DCT_BASIS.T
+    bits = low_frequencies > np.median(low_frequencies)
+    hash_bits: np.uint64 = np.packbits(bits).view(np.uint64)[0]
+    return hash_bits
+
+
+def capture_phash(frame: CaptureFrame, size: tuple[int, int], mask: Optional[ComparisonMask]):
+    """
+    Frame stage: the pHash of the capture, calculated once per distinct mask
+    """
+    return phash(frame.get(grayscale, size), mask)
+
+
+def prepare_phash(source: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
+    # Since pHash doesn't have any masking itself, masked out pixels are set to black
+    # in both the source and capture before calculating the pHash of each images.
+    # As a result of this, this function is not going to be very
+    # helpful for large masks as the images when shrinked down to 8x8 will mostly be
+    # the same
+    phash_mask = comparison_mask(mask)
+    return PHashReference(phash(source, phash_mask), image_size(source), phash_mask)
 
-    return 1 - (min_val / max_error)
+
+def compare_prepared_phash(reference: PHashReference, frame: CaptureFrame):
+    # Hamming distance is the popcount of the XOR between the two 64 bits hashes
+    capture_hash = frame.get(capture_phash, reference.size, reference.mask)
+    hash_diff = bin(int(reference.hash ^ capture_hash)).count("1")
+    return 1 - (hash_diff / PHASH_BITS)
 
 
 def compare_phash(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[cv2.ndarray] = None):
@@ -88,21 +819,28 @@ def compare_phash(source: cv2.ndarray, capture: cv2.ndarray, mask: Optional[cv2.
     @return: The similarity between the hashes of the image as a number 0 to 1.
     """
 
-    # Since imagehash doesn't have any masking itself, bitwise_and will allow us
-    # to apply the mask to the source and capture before calculating the pHash for
-    # each of the images. As a result of this, this function is not going to be very
-    # helpful for large masks as the images when shrinked down to 8x8 will mostly be
-    # the same
-    if mask is not None:
-        source = cv2.bitwise_and(source, source, mask=mask)
-        capture = cv2.bitwise_and(capture, capture, mask=mask)
+    return compare_prepared_phash(prepare_phash(source, mask), CaptureFrame(capture))
 
-    source_hash = imagehash.phash(Image.fromarray(source))
-    capture_hash = imagehash.phash(Image.fromarray(capture))
-    hash_diff = source_hash - capture_hash
-    if not hash_diff:
-        return 0.0
-    return 1 - (hash_diff / 64.0)
+
+# Indexed the same way as the comparison method combobox
+COMPARISON_METHODS = [
+    ComparisonMethod(
+        "L2 Norm",
+        prepare_l2_norm,
+        compare_prepared_l2_norm,
+        coarse_to_fine=True,
+        compare_with_threshold=compare_prepared_l2_norm_with_threshold),
+    ComparisonMethod("Histograms", prepare_histograms, compare_prepared_histograms),
+    ComparisonMethod("pHash", prepare_phash, compare_prepared_phash),
+    ComparisonMethod(
+        "Sampled L2 Norm",
+        prepare_sampled_l2_norm,
+        compare_prepared_sampled_l2_norm,
+        estimate=estimate_sampled_l2_norm),
+    ComparisonMethod("Thumbnail", prepare_thumbnail, compare_prepared_thumbnail),
+    ComparisonMethod("SSIM", prepare_ssim, compare_prepared_ssim),
+    ComparisonMethod("Template Search", prepare_template_search, compare_prepared_template_search),
+]
 
 
 def check_if_image_has_transparency(image: cv2.ndarray):
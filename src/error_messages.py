@@ -26,7 +26,16 @@ def split_image_directory_not_found():
 
 
 def split_image_directory_empty():
-    set_text_message("The Split Image Folder is empty.")
+    set_text_message("The Split Image Folder does not contain any image.")
+
+
+def route_pack(path: str):
+    set_text_message(f'"{path}" is not a valid route pack, or was exported with a different '
+                     "Comparison Resolution or Grayscale Comparison option. Export it again from the split images.")
+
+
+def route_pack_export(path: str, details: str):
+    set_text_message(f'Could not export the route pack to "{path}".', details)
 
 
 def image_type(image: str):
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from collections.abc import Iterable
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from capture_frame import CaptureFrame, resized
+
+
+class FrameChangeDetector():
+    """
+    Detects captures that are identical to the previous one, by comparing them at every comparison size.
+    The pixels are picked by the same nearest neighbor resizes as the comparisons, so the comparisons
+    can't tell an unchanged capture apart from the previous one either.
+    Unchanged captures reuse the previous frame, and with it every stage and similarity already computed.
+    Changed captures can follow the previous frame, so that stages only update the tiles that changed.
+    """
+    sizes: list[tuple[int, int]]
+    frame_count = 0
+    unchanged_frame_count = 0
+    avoided_comparison_count = 0
+    """Similarities that were reused instead of being compared again"""
+    __previous_frame: Optional[CaptureFrame] = None
+    __previous_signature: Optional[list[cv2.ndarray]] = None
+
+    def __init__(self, size: tuple[int, int]):
+        self.sizes = [size]
+
+    def set_sizes(self, sizes: Iterable[tuple[int, int]]):
+        """
+        Set the sizes the images are compared at. The previous frame is forgotten if they changed.
+        """
+        unique_sizes = sorted(set(sizes))
+        if unique_sizes and unique_sizes != self.sizes:
+            self.sizes = unique_sizes
+            self.reset()
+
+    def next_frame(self, capture: cv2.ndarray, skip_unchanged: bool, follow_previous: bool):
+        """
+        Get the frame to compare a new capture with
+
+        @param skip_unchanged: Reuse the previous frame if the capture didn't change
+        @param follow_previous: Link the new frame to the previous one, for incremental comparisons
+        @return: The previous frame if the capture didn't change, otherwise a new frame
+        """
+        self.frame_count += 1
+        frame = CaptureFrame(capture)
+        signature = None
+        if skip_unchanged:
+            signature = [frame.get(resized, size) for size in self.sizes]
+            if self.__previous_frame is not None \
+                    and self.__previous_signature is not None \
+                    and all(
+                        np.array_equal(resized_capture, previous_resized_capture)
+                        for resized_capture, previous_resized_capture
+                        in zip(signature, self.__previous_signature)):
+                self.unchanged_frame_count += 1
+                return self.__previous_frame
+
+        if follow_previous and self.__previous_frame is not None:
+            frame.follow(self.__previous_frame)
+        self.__previous_frame = frame
+        self.__previous_signature = signature
+        return frame
+
+    def reset(self):
+        self.frame_count = 0
+        self.unchanged_frame_count = 0
+        self.avoided_comparison_count = 0
+        self.__previous_frame = None
+        self.__previous_signature = None
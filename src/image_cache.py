@@ -0,0 +1,99 @@
+from __future__ import annotations
+import os
+from hashlib import blake2b
+from typing import Optional
+from zipfile import BadZipFile
+
+import cv2
+import numpy as np
+import pywintypes
+import win32api
+import win32con
+
+# Hidden folder inside the split image folder where the loaded images are cached
+IMAGE_CACHE_DIRECTORY = ".autosplit_cache"
+# Bumped whenever the way images are loaded changes, so that older cache entries are never used
+IMAGE_CACHE_VERSION = 1
+
+
+def __key(key: str):
+    return blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def __source_key(filename: str, file_stamp: tuple[int, int]):
+    """
+    Start of the name of the cache files of an image file. The file's modification time and size are part of it,
+    so that changing the image automatically stops using its previous cache entries.
+    """
+    return __key(f"{IMAGE_CACHE_VERSION}|{filename}|{file_stamp}")
+
+
+def image_cache_file(path: str, size: tuple[int, int], grayscale: bool):
+    """
+    Get the cache file of an image loaded with these settings
+
+    @return: The path of the cache file, or None if the image can't be found
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    source_key = __source_key(os.path.basename(path), (stat.st_mtime_ns, stat.st_size))
+    return os.path.join(
+        os.path.dirname(path),
+        IMAGE_CACHE_DIRECTORY,
+        f"{source_key}-{__key(f'{size}|{grayscale}')}.npz")
+
+
+def load_cached_image(cache_file: str) -> Optional[tuple[cv2.ndarray, Optional[cv2.ndarray]]]:
+    """
+    @return: The cached image and its mask, or None if there is no valid cache entry
+    """
+    try:
+        with np.load(cache_file) as cached:
+            return cached["image"], cached["mask"] if "mask" in cached else None
+    except (OSError, ValueError, KeyError, BadZipFile):
+        return None
+
+
+def save_cached_image(cache_file: str, image: cv2.ndarray, mask: Optional[cv2.ndarray]):
+    """
+    Saves the loaded image and its mask. The cache is only an optimization, so failing to write it is ignored.
+    """
+    directory = os.path.dirname(cache_file)
+    # Written to a temporary file first, so that an interrupted write never leaves a truncated entry
+    temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            win32api.SetFileAttributes(directory, win32con.FILE_ATTRIBUTE_HIDDEN)
+        with open(temporary_file, "wb") as file:
+            if mask is None:
+                np.savez(file, image=image)
+            else:
+                np.savez(file, image=image, mask=mask)
+        os.replace(temporary_file, cache_file)
+    except (OSError, pywintypes.error):
+        pass
+
+
+def prune_image_cache(split_image_directory: str, file_stamps: dict[str, tuple[int, int]]):
+    """
+    Deletes the cache entries of images that were modified or removed, and leftover temporary files.
+    Entries of unchanged images loaded with other settings are kept, so that switching settings back is still fast.
+
+    @param file_stamps: Modification time and size of every file in the split image folder, by filename
+    """
+    directory = os.path.join(split_image_directory, IMAGE_CACHE_DIRECTORY)
+    try:
+        cache_names = os.listdir(directory)
+    except OSError:
+        return
+    source_keys = {__source_key(filename, file_stamp) for filename, file_stamp in file_stamps.items()}
+    for cache_name in cache_names:
+        if cache_name.endswith(".npz") and cache_name.split("-", 1)[0] in source_keys:
+            continue
+        try:
+            os.remove(os.path.join(directory, cache_name))
+        except OSError:
+            pass
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import os
+from typing import Optional
+
+from AutoSplitImage import SUPPORTED_IMREAD_FORMATS, AutoSplitImage
+from route_pack import ROUTE_PACK_FILENAME
+
+FileStamp = tuple[int, int]
+"""Modification time, in nanoseconds, and size of a file"""
+
+
+def split_image_file_stamps(directory: str) -> dict[str, FileStamp]:
+    """
+    Get the modification time and size of every split image and of the route pack, by filename.
+    On Windows, they come with the directory listing, without opening any file.
+    """
+    file_stamps: dict[str, FileStamp] = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(SUPPORTED_IMREAD_FORMATS) or entry.name == ROUTE_PACK_FILENAME:
+                stat = entry.stat()
+                file_stamps[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return file_stamps
+
+
+class LoadedRoute():
+    """
+    The split images kept loaded between runs, with the modification time and size of their file when they were
+    loaded. Resets and finished runs only load again the images that were added, modified or removed since,
+    and nothing at all when the split image folder didn't change.
+    """
+    __settings: Optional[tuple[str, tuple[int, int], bool, bool]] = None
+    __file_stamps: dict[str, FileStamp]
+    __images: dict[str, AutoSplitImage]
+
+    def __init__(self):
+        self.__file_stamps = {}
+        self.__images = {}
+
+    def set_settings(self, directory: str, comparison_size: tuple[int, int], grayscale: bool, lazy: bool):
+        """
+        Set the split image folder and the settings images are loaded with.
+        Every loaded image is forgotten if they changed.
+        """
+        settings = (directory, comparison_size, grayscale, lazy)
+        if settings != self.__settings:
+            self.__settings = settings
+            self.__file_stamps = {}
+            self.__images = {}
+
+    def is_unchanged(self, file_stamps: dict[str, FileStamp]):
+        """
+        Whether no file was added, modified or removed since the images were loaded
+        """
+        return bool(self.__images) and file_stamps == self.__file_stamps
+
+    def clear(self):
+        self.__file_stamps = {}
+        self.__images = {}
+
+    def images(self):
+        return list(self.__images.values())
+
+    def get(self, filename: str, file_stamp: FileStamp):
+        """
+        @return: The image loaded from this file, or None if it wasn't loaded or was modified since
+        """
+        if self.__file_stamps.get(filename) != file_stamp:
+            return None
+        return self.__images.get(filename)
+
+    def update(self, file_stamps: dict[str, FileStamp], images: list[AutoSplitImage]):
+        self.__file_stamps = file_stamps
+        self.__images = {os.path.basename(image.path): image for image in images}
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+if TYPE_CHECKING:
+    from AutoSplit import AutoSplit
+
+from AutoSplitImage import AutoSplitImage
+from capture_frame import CaptureFrame
+from hotkeys import send_command
+from split_parser import BELOW_FLAG, DUMMY_FLAG, PAUSE_FLAG
+
+LOOK_AHEAD_SPLITS = 3
+"""Amount of split images after the current one that are also compared"""
+LOOK_AHEAD_FRAME_INTERVAL = 3
+"""The split images ahead are only compared every few frames"""
+LOOK_AHEAD_MARGIN = 0.02
+"""How far above its threshold a split image ahead must be to be considered as clearly matching"""
+
+
+class LookAhead():
+    """
+    The next few split images, compared with the capture to recover from missed splits.
+    Gathering the split images ahead is only done once per split image,
+    and they share the resized capture of the frame.
+    """
+    __split_image_number = -1
+    """Split image number the split images ahead were gathered for"""
+    __images: list[tuple[int, AutoSplitImage]]
+
+    def __init__(self):
+        self.__images = []
+
+    def reset(self):
+        self.__split_image_number = -1
+        self.__images = []
+
+    def __gather_images(self, autosplit: AutoSplit):
+        self.__split_image_number = autosplit.split_image_number
+        self.__images = []
+        for split_image_number in range(
+                autosplit.split_image_number + 1,
+                min(autosplit.split_image_number + 1 + LOOK_AHEAD_SPLITS,
+                    len(autosplit.split_images_and_loop_number))):
+            image = autosplit.split_images_and_loop_number[split_image_number][0]
+            # The next loops of the current image would match at the same time as the current image,
+            # and images with the below flag only split once they stop matching
+            if image is not autosplit.split_image \
+                    and not image.check_flag(BELOW_FLAG) \
+                    and image not in (look_ahead_image for _, look_ahead_image in self.__images):
+                self.__images.append((split_image_number, image))
+
+    def find_missed_split(self, autosplit: AutoSplit, capture: CaptureFrame) -> Optional[int]:
+        """
+        @return: The number of the first split image ahead that clearly matches the capture, if any
+        """
+        if self.__split_image_number != autosplit.split_image_number:
+            self.__gather_images(autosplit)
+
+        comparison_method = autosplit.comparison_method_combobox.currentIndex()
+        for split_image_number, image in self.__images:
+            # A lazy image that fails to decode is reported once it becomes the current split image
+            image.load()
+            if image.bytes is None:
+                continue
+            similarity = image.compare_with_capture(comparison_method, capture)
+            if similarity >= image.get_similarity_threshold(autosplit) + LOOK_AHEAD_MARGIN:
+                return split_image_number
+        return None
+
+
+def send_missed_splits(autosplit: AutoSplit, split_image_number: int):
+    """
+    Send the splits of the split images from the current one up to, excluding, this split image number
+    """
+    for missed_image, _ in autosplit.split_images_and_loop_number[autosplit.split_image_number:split_image_number]:
+        if not missed_image.check_flag(DUMMY_FLAG):
+            send_command(autosplit, "pause" if missed_image.check_flag(PAUSE_FLAG) else "split")
@@ -14,6 +14,7 @@ from requests.exceptions import RequestException
 
 import error_messages
 import settings_file as settings
+from AutoSplitImage import MAX_COMPARISON_PIXEL_BUDGET
 from gen import about, design, resources_rc, update_checker  # noqa: F401
 
 # AutoSplit Version number
@@ -92,3 +93,17 @@ class __CheckForUpdatesThread(QThread):
 def check_for_updates(autosplit: AutoSplit, check_on_open: bool = False):
     autosplit.CheckForUpdatesThread = __CheckForUpdatesThread(autosplit, check_on_open)
     autosplit.CheckForUpdatesThread.start()
+
+
+def set_comparison_pixel_budget(autosplit: AutoSplit):
+    pixel_budget, ok = QtWidgets.QInputDialog.getInt(
+        autosplit,
+        "Comparison Resolution",
+        "Maximum amount of pixels per comparison, 0 to compare at a fixed 320x240.\n"
+        "The aspect ratio of the capture region is kept, and it is never upscaled.\n"
+        "Takes effect the next time the split images are loaded.",
+        autosplit.comparison_pixel_budget,
+        0,
+        MAX_COMPARISON_PIXEL_BUDGET)
+    if ok:
+        autosplit.comparison_pixel_budget = pixel_budget
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import json
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from AutoSplitImage import SUPPORTED_IMREAD_FORMATS, AutoSplitImage
+
+# Single file inside the split image folder holding every loaded split image
+ROUTE_PACK_FILENAME = "route.autosplitpack"
+ROUTE_PACK_MAGIC = b"AUTOSPLIT_PACK\0\0"
+# Bumped whenever the layout of the pack or the way images are loaded changes
+ROUTE_PACK_VERSION = 1
+# Arrays start on cache line boundaries
+ROUTE_PACK_ALIGNMENT = 64
+HEADER_LENGTH_SIZE = 8
+
+
+def __aligned(offset: int):
+    return -(-offset // ROUTE_PACK_ALIGNMENT) * ROUTE_PACK_ALIGNMENT
+
+
+def write_route_pack(path: str, images: list[AutoSplitImage], comparison_size: tuple[int, int], grayscale: bool):
+    """
+    Write the loaded split images to a route pack: a JSON header, then the pixels and masks of every image
+    as contiguous arrays. Only the filenames are kept as metadata, they are parsed again when the pack is opened
+    so that thresholds, pauses, delays, loops and flags follow the exact same rules as split image files.
+
+    @param comparison_size: Comparison width and height the images were loaded at
+    @param grayscale: Whether the images were loaded with the Grayscale Comparison option
+    """
+    entries: list[dict[str, object]] = []
+    arrays: list[tuple[int, cv2.ndarray]] = []
+    offset = 0
+    for image in images:
+        if image.bytes is None:
+            raise ValueError(f'"{image.path}" is not loaded')
+        entry: dict[str, object] = {"filename": os.path.basename(image.path), "shape": image.bytes.shape}
+        for key, array in (("offset", image.bytes), ("mask_offset", image.mask)):
+            if array is None:
+                entry[key] = None
+                continue
+            entry[key] = offset
+            arrays.append((offset, np.ascontiguousarray(array)))
+            offset = __aligned(offset + array.nbytes)
+        entries.append(entry)
+
+    header = json.dumps({
+        "version": ROUTE_PACK_VERSION,
+        "comparison_size": comparison_size,
+        "grayscale": grayscale,
+        "images": entries,
+    }).encode()
+    data_start = __aligned(len(ROUTE_PACK_MAGIC) + HEADER_LENGTH_SIZE + len(header))
+
+    # Written to a temporary file first, so that an interrupted export never leaves a truncated pack
+    temporary_file = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_file, "wb") as file:
+        file.write(ROUTE_PACK_MAGIC)
+        file.write(len(header).to_bytes(HEADER_LENGTH_SIZE, "little"))
+        file.write(header)
+        for array_offset, array in arrays:
+            file.seek(data_start + array_offset)
+            file.write(array.data)
+        file.truncate(data_start + offset)
+    os.replace(temporary_file, path)
+
+
+def __read_header(path: str):
+    with open(path, "rb") as file:
+        if file.read(len(ROUTE_PACK_MAGIC)) != ROUTE_PACK_MAGIC:
+            raise ValueError("Not a route pack")
+        header_length = int.from_bytes(file.read(HEADER_LENGTH_SIZE), "little")
+        header = json.loads(file.read(header_length))
+    if header["version"] != ROUTE_PACK_VERSION:
+        raise ValueError("Unsupported route pack version")
+    return header, __aligned(len(ROUTE_PACK_MAGIC) + HEADER_LENGTH_SIZE + header_length)
+
+
+def __is_up_to_date(file_stamps: dict[str, tuple[int, int]], filenames: set[str]):
+    """
+    Whether the route pack was exported from the split images currently in the folder. A folder that only
+    contains the pack, for instance a shared route, always uses it.
+    """
+    pack_time = file_stamps[ROUTE_PACK_FILENAME][0]
+    image_names = {filename for filename in file_stamps if filename.lower().endswith(SUPPORTED_IMREAD_FORMATS)}
+    return all(file_stamps[image_name][0] <= pack_time for image_name in image_names) \
+        and (not image_names or image_names == filenames)
+
+
+def __view(data: np.memmap, offset: int, shape: tuple[int, ...]) -> cv2.ndarray:
+    """
+    A zero-copy view of an array of the pack
+    """
+    size = int(np.prod(shape))
+    if offset + size > data.size:
+        raise ValueError("Truncated route pack")
+    return data[offset:offset + size].reshape(shape)
+
+
+def open_route_pack(
+    directory: str,
+    comparison_size: tuple[int, int],
+    grayscale: bool,
+    file_stamps: dict[str, tuple[int, int]]
+):
+    """
+    Open the route pack of the split image folder. The pixels and masks are memory-mapped, so they are
+    only read from disk when first compared, and are shared with other processes that opened the same pack.
+
+    @param file_stamps: Modification time and size of the files of the split image folder, by filename
+    @return: The split images, or None if there is no pack, if it is invalid, outdated,
+    or was exported with a different comparison resolution or Grayscale Comparison option
+    """
+    if ROUTE_PACK_FILENAME not in file_stamps:
+        return None
+    path = os.path.join(directory, ROUTE_PACK_FILENAME)
+    try:
+        header, data_start = __read_header(path)
+        if tuple(header["comparison_size"]) != comparison_size \
+                or header["grayscale"] != grayscale \
+                or not __is_up_to_date(file_stamps, {entry["filename"] for entry in header["images"]}):
+            return None
+        data = np.memmap(path, dtype=np.uint8, mode="r", offset=data_start)
+        images: list[AutoSplitImage] = []
+        for entry in header["images"]:
+            shape = tuple(entry["shape"])
+            image = __view(data, entry["offset"], shape)
+            mask_offset: Optional[int] = entry["mask_offset"]
+            mask = None if mask_offset is None else __view(data, mask_offset, shape[:2])
+            images.append(AutoSplitImage(
+                os.path.join(directory, entry["filename"]),
+                grayscale,
+                comparison_size,
+                loaded=(image, mask)))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return images
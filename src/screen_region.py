@@ -15,6 +15,8 @@ from win32con import GA_ROOT, MAXBYTE, SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN, SM_
 
 import capture_windows
 import error_messages
+from AutoSplitImage import SUPPORTED_IMREAD_FORMATS
+from route_pack import ROUTE_PACK_FILENAME
 
 
 WINDOWS_SHADOW_SIZE = 8
@@ -220,7 +222,10 @@ def validate_before_parsing(autosplit: AutoSplit, show_error: bool = True, check
         error = error_messages.split_image_directory
     elif not os.path.isdir(autosplit.split_image_directory):
         error = error_messages.split_image_directory_not_found
-    elif check_empty_directory and not os.listdir(autosplit.split_image_directory):
+    elif check_empty_directory and not any(
+            image_name.lower().endswith(SUPPORTED_IMREAD_FORMATS) or image_name == ROUTE_PACK_FILENAME
+            for image_name
+            in os.listdir(autosplit.split_image_directory)):
         error = error_messages.split_image_directory_empty
     elif autosplit.hwnd <= 0 or not win32gui.GetWindowText(autosplit.hwnd):
         error = error_messages.region
@@ -21,6 +21,20 @@ FROZEN = hasattr(sys, "frozen")
 # Get the directory of either AutoSplit.exe or AutoSplit.py
 auto_split_directory = os.path.dirname(sys.executable if FROZEN else os.path.abspath(__file__))
 
+# Default values of the settings added after v1.6, in the order they are saved.
+# Used to complete settings files saved before these settings existed.
+NEW_SETTINGS_DEFAULTS: list[Any] = [
+    False,  # Look ahead for missed splits
+    False,  # Coarse to fine comparison
+    False,  # Early threshold decision
+    False,  # Skip unchanged frames
+    False,  # Incremental comparison
+    False,  # Grayscale comparison
+    0,  # Comparison pixel budget
+    False,  # Cache split images
+    False,  # Lazy split image loading
+]
+
 
 class RestrictedUnpickler(pickle.Unpickler):
 
@@ -60,7 +74,16 @@ def get_save_settings_values(autosplit: AutoSplit):
         int(autosplit.group_dummy_splits_checkbox.isChecked()),
         int(autosplit.loop_checkbox.isChecked()),
         int(autosplit.auto_start_on_reset_checkbox.isChecked()),
-        autosplit.force_print_window_checkbox.isChecked()]
+        autosplit.force_print_window_checkbox.isChecked(),
+        autosplit.action_look_ahead.isChecked(),
+        autosplit.action_coarse_to_fine.isChecked(),
+        autosplit.action_early_threshold_decision.isChecked(),
+        autosplit.action_skip_unchanged_frames.isChecked(),
+        autosplit.action_incremental_comparison.isChecked(),
+        autosplit.action_grayscale_comparison.isChecked(),
+        autosplit.comparison_pixel_budget,
+        autosplit.action_cache_split_images.isChecked(),
+        autosplit.action_lazy_split_image_loading.isChecked()]
 
 
 def have_settings_changed(autosplit: AutoSplit):
@@ -118,10 +141,12 @@ def __load_settings_from_file(autosplit: AutoSplit):
             # v1.5 settings
             if settings_count == 20:
                 settings.insert(21, False)
-            # v1.6.X settings
-            elif settings_count != 21:
+            # v1.6.X settings and newer
+            elif not 21 <= settings_count <= 21 + len(NEW_SETTINGS_DEFAULTS):
                 autosplit.show_error_signal.emit(error_messages.invalid_settings)
                 return
+            # Add the default values of settings that didn't exist yet when this file was saved
+            settings.extend(NEW_SETTINGS_DEFAULTS[len(settings) - 21:])
             autosplit.last_loaded_settings = settings
     except (FileNotFoundError, MemoryError, pickle.UnpicklingError):
         autosplit.show_error_signal.emit(error_messages.invalid_settings)
@@ -148,6 +173,15 @@ def __load_settings_from_file(autosplit: AutoSplit):
     autosplit.loop_checkbox.setChecked(bool(settings[18]))
     autosplit.auto_start_on_reset_checkbox.setChecked(bool(settings[19]))
     autosplit.force_print_window_checkbox.setChecked(settings[20])
+    autosplit.action_look_ahead.setChecked(settings[21])
+    autosplit.action_coarse_to_fine.setChecked(settings[22])
+    autosplit.action_early_threshold_decision.setChecked(settings[23])
+    autosplit.action_skip_unchanged_frames.setChecked(settings[24])
+    autosplit.action_incremental_comparison.setChecked(settings[25])
+    autosplit.action_grayscale_comparison.setChecked(settings[26])
+    autosplit.comparison_pixel_budget = settings[27]
+    autosplit.action_cache_split_images.setChecked(settings[28])
+    autosplit.action_lazy_split_image_loading.setChecked(settings[29])
 
     keyboard.unhook_all()
     if not autosplit.is_auto_controlled:
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from AutoSplitImage import AutoSplitImage
+
+# Split images kept loaded before the current one, so that undoing a split doesn't wait for it to load
+SPLIT_IMAGE_WINDOW_BEHIND = 1
+
+
+class SplitImageWindow():
+    """
+    Keeps only the split images around the current one loaded, when split images are loaded lazily.
+    The next split images are loaded and prepared in the background before they are needed,
+    and every other split image is unloaded, so that memory doesn't grow with the length of the route.
+    """
+    ahead: int
+    """Split images kept loaded after the current one"""
+    __images: list[AutoSplitImage]
+    __window: dict[int, AutoSplitImage]
+    # Held while moving the window and while checking whether an image is in it, never while an image loads
+    __lock: Lock
+    # A single thread, so that prefetching never competes with the comparisons for more than one core.
+    # Images are also unloaded there, since unloading waits for an image that is being loaded.
+    __executor: ThreadPoolExecutor
+
+    def __init__(self, ahead: int):
+        self.ahead = ahead
+        self.__images = []
+        self.__window = {}
+        self.__lock = Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=1)
+
+    def set_images(self, images: list[AutoSplitImage]):
+        """
+        @param images: The split image of each split image number, repeated for each loop
+        """
+        self.__images = images
+
+    def clear(self):
+        """
+        Forget the split images, once the prefetches and unloads already queued are done
+        """
+        self.__images = []
+        with self.__lock:
+            self.__window = {}
+        self.__executor.submit(lambda: None).result()
+
+    def move_to(self, split_image_number: int, comparison_method: int):
+        """
+        Load the split images around the current one, and unload the split images that left the window
+        """
+        behind = self.__images[max(0, split_image_number - SPLIT_IMAGE_WINDOW_BEHIND):split_image_number]
+        ahead = self.__images[split_image_number:split_image_number + self.ahead + 1]
+        with self.__lock:
+            previous_window = self.__window
+            self.__window = {id(image): image for image in behind + ahead}
+        for image_id, image in previous_window.items():
+            if image_id not in self.__window:
+                self.__executor.submit(self.__unload, image)
+
+        # The current split image first, then the next ones in the order they will be needed
+        for image in ahead + behind:
+            self.__executor.submit(self.__prefetch, image, comparison_method)
+
+    def __unload(self, image: AutoSplitImage):
+        # Only ran on the prefetching thread, which is the only one that loads images outside of the window,
+        # so unloading never waits for an image to load while holding the lock
+        with self.__lock:
+            if id(image) not in self.__window:
+                image.unload()
+
+    def __prefetch(self, image: AutoSplitImage, comparison_method: int):
+        with self.__lock:
+            if id(image) not in self.__window:
+                return
+        image.get_prepared(image.get_comparison_method(comparison_method))
+        # The image may have left the window while it was loading
+        self.__unload(image)
@@ -1,17 +1,23 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from AutoSplit import AutoSplit
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import error_messages
-from AutoSplitImage import AutoSplitImage, ImageType
+from AutoSplitImage import SUPPORTED_IMREAD_FORMATS, AutoSplitImage, ImageType, comparison_size_for_budget
+from image_cache import prune_image_cache
+from compare import COMPARISON_METHODS
+from loaded_route import FileStamp, LoadedRoute, split_image_file_stamps
+from route_pack import ROUTE_PACK_FILENAME, open_route_pack, write_route_pack
 
 
 [DUMMY_FLAG,
  BELOW_FLAG,
  PAUSE_FLAG,
+ GRAYSCALE_FLAG,
  *_] = [1 << i for i in range(31)]  # 32 bits of flags
 
 
@@ -95,6 +101,43 @@ def loop_from_filename(filename: str):
     return loop if loop >= 1 else 1
 
 
+def comparison_method_from_filename(filename: str):
+    """
+    Retrieve the comparison method index from the filename, if there is no comparison method or the index
+    isn't a valid comparison method, then None is returned
+
+    @param filename: String containing the file's name
+    @return: A valid comparison method index, if not then None
+    """
+
+    # Check to make sure there is a valid index between carets of the filename
+    try:
+        comparison_method = int(filename.split("^", 1)[1].split("^")[0])
+    except (IndexError, ValueError):
+        return None
+
+    return comparison_method if 0 <= comparison_method < len(COMPARISON_METHODS) else None
+
+
+def comparison_size_from_filename(filename: str):
+    """
+    Retrieve the comparison width and height from the filename, written as `WxH`, if there is no comparison size
+    or it isn't valid, then None is returned
+
+    @param filename: String containing the file's name
+    @return: A valid comparison width and height, if not then None
+    """
+
+    # Check to make sure there are two valid dimensions between percent signs of the filename
+    try:
+        width, height = (int(dimension) for dimension in filename.split("%", 1)[1].split("%")[0].split("x"))
+    except (IndexError, ValueError):
+        return None
+
+    # Both dimensions should always be positive
+    return (width, height) if width >= 1 and height >= 1 else None
+
+
 def flags_from_filename(filename: str):
     """
     Retrieve the flags from the filename, if there are no flags then 0 is returned
@@ -106,6 +149,7 @@ def flags_from_filename(filename: str):
     "d" = dummy, do nothing when this split is found
     "b" = below threshold, after threshold is met, split when it goes below the threhsold.
     "p" = pause, hit pause key when this split is found
+    "g" = grayscale, compare this image in grayscale only
     """
 
     # Check to make sure there are flags between curly braces
@@ -125,6 +169,8 @@ def flags_from_filename(filename: str):
             flags |= BELOW_FLAG
         elif character == "P":
             flags |= PAUSE_FLAG
+        elif character == "G":
+            flags |= GRAYSCALE_FLAG
         # Legacy flags
         elif character == "M":
             continue
@@ -150,12 +196,130 @@ def __pop_image_type(split_image: list[AutoSplitImage], image_type: ImageType):
     return None
 
 
-def parse_and_validate_images(autosplit: AutoSplit):
-    # Get split images
-    all_images = [
-        AutoSplitImage(os.path.join(autosplit.split_image_directory, image_name))
+def __comparison_settings(autosplit: AutoSplit):
+    """
+    @return: The comparison width and height, and whether images are loaded in grayscale
+    """
+    # Images and captures are compared at the size that fits the capture region in the pixel budget
+    selection = autosplit.selection
+    comparison_size = comparison_size_for_budget(
+        (selection.right - selection.left, selection.bottom - selection.top),
+        autosplit.comparison_pixel_budget)
+    return comparison_size, autosplit.action_grayscale_comparison.isChecked()
+
+
+def __load_images(
+    autosplit: AutoSplit,
+    comparison_size: tuple[int, int],
+    grayscale: bool,
+    file_stamps: dict[str, FileStamp],
+    loaded_route: Optional[LoadedRoute] = None,
+    lazy: bool = False
+):
+    """
+    @param loaded_route: Images that were already loaded, reused if their file wasn't modified since
+    @param lazy: Only parse the filenames, the images are loaded when needed
+    """
+    use_cache = autosplit.action_cache_split_images.isChecked()
+
+    def load_image(image_name: str):
+        image = None if loaded_route is None else loaded_route.get(image_name, file_stamps[image_name])
+        if image is None:
+            image_path = os.path.join(autosplit.split_image_directory, image_name)
+            image = AutoSplitImage(image_path, grayscale, comparison_size, use_cache, lazy=lazy)
+        return image
+
+    # Get split images. OpenCV releases the GIL while decoding and resizing, so they are loaded in parallel.
+    image_names = [
+        image_name
         for image_name
-        in os.listdir(autosplit.split_image_directory)]
+        in file_stamps
+        if image_name.lower().endswith(SUPPORTED_IMREAD_FORMATS)]
+    with ThreadPoolExecutor() as executor:
+        all_images = list(executor.map(load_image, image_names))
+    if use_cache:
+        prune_image_cache(autosplit.split_image_directory, file_stamps)
+    return all_images
+
+
+def __first_invalid_image(images: list[AutoSplitImage]):
+    return next((image for image in images if not image.is_valid()), None)
+
+
+def __release_split_images(autosplit: AutoSplit):
+    """
+    Drop every reference to the split images, so that a route pack they are mapped from can be replaced.
+    On Windows, a file can't be replaced while it is mapped.
+    """
+    autosplit.loaded_route.clear()
+    autosplit.split_image_window.clear()
+    autosplit.look_ahead.reset()
+    # Captures keep the images compared with them
+    autosplit.frame_change_detector.reset()
+    autosplit.split_images = []
+    autosplit.split_images_and_loop_number = []
+    autosplit.start_image = None
+    autosplit.reset_image = None
+    # Same state as before any split image was shown
+    if hasattr(autosplit, "split_image"):
+        del autosplit.split_image
+
+
+def export_route_pack(autosplit: AutoSplit):
+    """
+    Load the split images and write them to a route pack in the split image folder,
+    which is then opened instead of loading every image separately. The split images that were loaded
+    are released while writing it, then loaded again.
+    """
+    comparison_size, grayscale = __comparison_settings(autosplit)
+    # Loaded again rather than reused, since the images kept loaded could be mapped from the route pack itself
+    file_stamps = split_image_file_stamps(autosplit.split_image_directory)
+    all_images = __load_images(autosplit, comparison_size, grayscale, file_stamps)
+    if not all_images:
+        error_messages.split_image_directory_empty()
+        return
+    invalid_image = __first_invalid_image(all_images)
+    if invalid_image is not None:
+        error_messages.image_type(invalid_image.path)
+        return
+
+    __release_split_images(autosplit)
+    path = os.path.join(autosplit.split_image_directory, ROUTE_PACK_FILENAME)
+    try:
+        write_route_pack(path, all_images, comparison_size, grayscale)
+    except OSError as exception:
+        error_messages.route_pack_export(path, str(exception))
+    autosplit.load_start_image()
+
+
+def parse_and_validate_images(autosplit: AutoSplit):
+    comparison_size, grayscale = __comparison_settings(autosplit)
+    lazy = autosplit.action_lazy_split_image_loading.isChecked()
+    loaded_route = autosplit.loaded_route
+    loaded_route.set_settings(autosplit.split_image_directory, comparison_size, grayscale, lazy)
+    file_stamps = split_image_file_stamps(autosplit.split_image_directory)
+    # Nothing is loaded again on reset if the split image folder didn't change
+    if loaded_route.is_unchanged(file_stamps):
+        all_images = loaded_route.images()
+    else:
+        # A route pack exported from the current images is opened without loading every image
+        all_images = open_route_pack(autosplit.split_image_directory, comparison_size, grayscale, file_stamps)
+        if all_images is None:
+            all_images = __load_images(autosplit, comparison_size, grayscale, file_stamps, loaded_route, lazy)
+        loaded_route.update(file_stamps, all_images)
+    if not all_images:
+        autosplit.gui_changes_on_reset()
+        error_messages.route_pack(os.path.join(autosplit.split_image_directory, ROUTE_PACK_FILENAME))
+        return False
+
+    invalid_image = __first_invalid_image(all_images)
+    if invalid_image is not None:
+        autosplit.gui_changes_on_reset()
+        error_messages.image_type(invalid_image.path)
+        return False
+
+    # Captures can only be skipped as unchanged if they are unchanged at every size they are compared at
+    autosplit.frame_change_detector.set_sizes(image.size for image in all_images)
 
     # Find non-split images and then remove them from the list
     autosplit.start_image = __pop_image_type(all_images, ImageType.START)
@@ -165,11 +329,6 @@ def parse_and_validate_images(autosplit: AutoSplit):
     # Make sure that each of the images follows the guidelines for correct format
     # according to all of the settings selected by the user.
     for image in autosplit.split_images:
-        # Test for image without transparency
-        if image.bytes is None:
-            autosplit.gui_changes_on_reset()
-            return False
-
         # error out if there is a {p} flag but no pause hotkey set and is not auto controlled.
         if (not autosplit.pause_hotkey_input.text()
                 and image.check_flag(PAUSE_FLAG)
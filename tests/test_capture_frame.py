@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+
+from capture_frame import CaptureFrame, resampled, resized_region
+
+# Sizes where a nearest neighbor resize to 320x240 doesn't pick the pixels of an exact integer ratio
+CAPTURE_SIZES = [(832, 624), (1920, 1080), (1366, 768), (641, 479), (333, 777), (321, 241), (1001, 999)]
+COMPARISON_SIZES = [(320, 240), (317, 239), (213, 160)]
+# Comparison sizes the pixel budgets 50000, 150000 and 500000 give a 1920x1080 capture region
+BUDGET_COMPARISON_SIZES = [(298, 167), (516, 290), (942, 530)]
+
+
+def random_capture(size: tuple[int, int], channels: int = 4):
+    return np.random.default_rng(0).integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("capture_size", CAPTURE_SIZES)
+@pytest.mark.parametrize("size", COMPARISON_SIZES)
+def test_resized_region_matches_resize(capture_size: tuple[int, int], size: tuple[int, int]):
+    capture = random_capture(capture_size)
+    resized = cv2.resize(capture, size, interpolation=cv2.INTER_NEAREST)[..., :3]
+    for x, y, width, height in [(0, 0, *size), (5, 7, 31, 31), (size[0] - 13, size[1] - 11, 13, 11)]:
+        region = resized_region(CaptureFrame(capture), size, (x, y, width, height))
+        assert np.array_equal(region, resized[y:y + height, x:x + width])
+
+
+@pytest.mark.parametrize("size", BUDGET_COMPARISON_SIZES)
+def test_region_maps_match_resize_at_budget_sizes(size: tuple[int, int]):
+    capture = random_capture((1920, 1080))
+    resized = cv2.resize(capture, size, interpolation=cv2.INTER_NEAREST)[..., :3]
+    x, y, width, height = 1, 2, size[0] - 3, size[1] - 4
+    region = resized_region(CaptureFrame(capture), size, (x, y, width, height))
+    assert np.array_equal(region, resized[y:y + height, x:x + width])
+
+
+@pytest.mark.parametrize("capture_size", CAPTURE_SIZES)
+@pytest.mark.parametrize("size", COMPARISON_SIZES)
+def test_resampled_matches_resize(capture_size: tuple[int, int], size: tuple[int, int]):
+    capture = random_capture(capture_size)
+    sampling_size = (128, 96)
+    resized = cv2.resize(capture, size, interpolation=cv2.INTER_NEAREST)
+    expected = cv2.resize(resized, sampling_size, interpolation=cv2.INTER_NEAREST)[..., :3]
+    assert np.array_equal(resampled(CaptureFrame(capture), size, sampling_size), expected)
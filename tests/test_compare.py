@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+
+from capture_frame import CaptureFrame
+from compare import compare_prepared_thumbnail, estimate_sampled_l2_norm, prepare_sampled_l2_norm, prepare_thumbnail
+
+CAPTURE_SIZES = [(832, 624), (1920, 1080), (641, 479)]
+
+
+def split_image_and_capture(capture_size: tuple[int, int], size: tuple[int, int] = (320, 240)):
+    """
+    A capture, and a split image that is a screenshot of it, loaded like AutoSplitImage does
+    """
+    capture = np.random.default_rng(0).integers(0, 256, (capture_size[1], capture_size[0], 4), dtype=np.uint8)
+    return cv2.resize(capture[..., :3], size, interpolation=cv2.INTER_NEAREST), capture
+
+
+@pytest.mark.parametrize("capture_size", CAPTURE_SIZES)
+def test_thumbnail_of_identical_capture(capture_size: tuple[int, int]):
+    source, capture = split_image_and_capture(capture_size)
+    reference = prepare_thumbnail(source)
+    assert compare_prepared_thumbnail(reference, CaptureFrame(capture)) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("capture_size", CAPTURE_SIZES)
+def test_sampled_l2_norm_of_identical_capture(capture_size: tuple[int, int]):
+    source, capture = split_image_and_capture(capture_size)
+    estimate = estimate_sampled_l2_norm(prepare_sampled_l2_norm(source), CaptureFrame(capture))
+    assert estimate == (1.0, 1.0, 1.0)
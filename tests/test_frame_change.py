@@ -0,0 +1,34 @@
+import numpy as np
+
+from capture_frame import CaptureFrame, nearest_indexes, resized_region
+from frame_change import FrameChangeDetector
+
+SIZE = (320, 240)
+REGION = (100, 50, 61, 47)
+
+
+def test_pixels_not_compared_are_unchanged():
+    capture = np.random.default_rng(0).integers(0, 256, (624, 832, 4), dtype=np.uint8)
+    detector = FrameChangeDetector(SIZE)
+    frame = detector.next_frame(capture, True, False)
+    region = frame.get(resized_region, SIZE, REGION)
+
+    # Every pixel a nearest neighbor resize to the comparison size doesn't pick changes
+    rows, cols = nearest_indexes(624, SIZE[1]), nearest_indexes(832, SIZE[0])
+    changed = 255 - capture
+    changed[np.ix_(rows, cols)] = capture[np.ix_(rows, cols)]
+    assert detector.next_frame(changed, True, False) is frame
+    assert np.array_equal(CaptureFrame(changed).get(resized_region, SIZE, REGION), region)
+
+
+def test_pixels_compared_in_a_region_are_changed():
+    capture = np.random.default_rng(0).integers(0, 256, (624, 832, 4), dtype=np.uint8)
+    x, y, width, height = REGION
+    rows = nearest_indexes(624, SIZE[1])[y:y + height]
+    cols = nearest_indexes(832, SIZE[0])[x:x + width]
+    for row, col in [(rows[0], cols[0]), (rows[-1], cols[-1]), (rows[height // 2], cols[width // 3])]:
+        detector = FrameChangeDetector(SIZE)
+        frame = detector.next_frame(capture, True, False)
+        changed = capture.copy()
+        changed[row, col, :3] = 255 - changed[row, col, :3]
+        assert detector.next_frame(changed, True, False) is not frame